@@ -2,7 +2,6 @@
 
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import threading
 import os
 import shutil
 import asyncio
@@ -14,16 +13,20 @@ from modules.mobi_converter import convert_mobi_to_epub
 
 from modules.styling_engine import StylingEngine
 from modules.pdf_generator import PDFGenerator
+from modules.epub_generator import EpubGenerator
 from modules.ai_assistant import AIAssistant
+from modules.vector_store import VECTOR_BACKENDS
 from modules.cache_manager import SemanticCache
 from modules.config_manager import ConfigManager
+from modules.job_scheduler import JobScheduler, TkEventPump, PRIORITY_HIGH, PRIORITY_LOW
+from modules import instrumentation, profiling
 
 class SettingsWindow(ctk.CTkToplevel):
     """The pop-up window for AI settings."""
     def __init__(self, master, config_manager):
         super().__init__(master)
         self.title("Settings")
-        self.geometry("450x300")
+        self.geometry("450x350")
         self.transient(master)
         self.grab_set()
 
@@ -44,32 +47,85 @@ class SettingsWindow(ctk.CTkToplevel):
         self.perplexity_key_entry.insert(0, self.config_manager.get_api_key("perplexity"))
         self.perplexity_key_entry.grid(row=2, column=1, padx=20, pady=10, sticky="ew")
 
-        ctk.CTkLabel(self, text="Changes require an app restart.", font=("", 10), text_color="gray").grid(row=3, column=0, columnspan=2, padx=20, pady=5)
+        ctk.CTkLabel(self, text="Vector Store").grid(row=3, column=0, padx=20, pady=10, sticky="w")
+        self.vector_backend_menu = ctk.CTkOptionMenu(self, values=list(VECTOR_BACKENDS))
+        self.vector_backend_menu.set(self.config_manager.get_vector_backend())
+        self.vector_backend_menu.grid(row=3, column=1, padx=20, pady=10, sticky="ew")
+
+        ctk.CTkLabel(self, text="Changes require an app restart.", font=("", 10), text_color="gray").grid(row=4, column=0, columnspan=2, padx=20, pady=5)
 
         save_button = ctk.CTkButton(self, text="Save and Close", command=self.save_and_close)
-        save_button.grid(row=4, column=0, columnspan=2, padx=20, pady=20)
+        save_button.grid(row=5, column=0, columnspan=2, padx=20, pady=20)
 
     def save_and_close(self):
         provider = self.provider_menu.get()
         openai_key = self.openai_key_entry.get()
         perplexity_key = self.perplexity_key_entry.get()
-        self.config_manager.save_config(provider, openai_key, perplexity_key)
+        vector_backend = self.vector_backend_menu.get()
+        self.config_manager.save_config(provider, openai_key, perplexity_key, vector_backend)
         self.destroy()
         messagebox.showinfo("Settings Saved", "Settings have been saved. Please restart the application for changes to take effect.")
 
 
+class StatsWindow(ctk.CTkToplevel):
+    """Live view of the pipeline metrics, refreshed once a second."""
+    REFRESH_MS = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Pipeline Stats")
+        self.geometry("620x420")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.textbox = ctk.CTkTextbox(self, wrap="none", font=("Courier", 12))
+        self.textbox.grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="nsew")
+        self.enable_button = ctk.CTkButton(self, text="Enable Metrics", command=self.enable_metrics)
+        self.enable_button.grid(row=1, column=0, padx=10, pady=10, sticky="w")
+        ctk.CTkButton(self, text="Reset", command=instrumentation.reset).grid(row=1, column=1, padx=10, pady=10, sticky="e")
+        self.refresh_id = None
+        self.refresh()
+
+    def destroy(self):
+        # A refresh still scheduled after closing would touch destroyed widgets.
+        if self.refresh_id is not None:
+            self.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        super().destroy()
+
+    def enable_metrics(self):
+        instrumentation.enable()
+        self.refresh()
+
+    def refresh(self):
+        if instrumentation.is_enabled():
+            text = instrumentation.format_table()
+            self.enable_button.configure(state="disabled")
+        else:
+            text = "Metrics are disabled.\n\nClick 'Enable Metrics', or start the app with BOOKALCHEMIST_METRICS=1."
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("end", text)
+        self.textbox.configure(state="disabled")
+        self.refresh_id = self.after(self.REFRESH_MS, self.refresh)
+
+
 class BookAlchemistApp(ctk.CTk):
     def __init__(self):
         super().__init__()
 
         self.title("Book Alchemist - Final Edition")
-        self.geometry("800x600")
+        self.geometry("800x640")
         ctk.set_appearance_mode("dark")
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(2, weight=1)
 
         # --- Initialize Managers ---
         self.config_manager = ConfigManager()
+        # All background work goes through one scheduler; its callbacks are
+        # run on the Tk main loop by the event pump, never on worker threads.
+        self.scheduler = JobScheduler(max_workers=2)
+        self.event_pump = TkEventPump(self, self.scheduler)
 
         # --- State Variables ---
         self.file_path = None
@@ -79,6 +135,8 @@ class BookAlchemistApp(ctk.CTk):
         self.semantic_cache = None
         self.active_ai_book_name = None
         self.active_ai_book_id = None
+        self.progress_job = None
+        self.parse_job = None
 
         # --- UI FRAMES ---
         top_frame = ctk.CTkFrame(self)
@@ -93,15 +151,23 @@ class BookAlchemistApp(ctk.CTk):
         self.settings_button = ctk.CTkButton(top_frame, text="Settings", command=self.open_settings)
         self.settings_button.grid(row=0, column=2, padx=10, pady=10)
 
+        self.stats_button = ctk.CTkButton(top_frame, text="Stats", width=70, command=self.open_stats)
+        self.stats_button.grid(row=0, column=3, padx=(0, 10), pady=10)
+
         action_frame = ctk.CTkFrame(self)
         action_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
         action_frame.grid_columnconfigure((0, 2), weight=1)
 
-        self.style_button = ctk.CTkButton(action_frame, text="1. Generate Styled PDF", command=self.start_styling_thread, state="disabled")
+        self.style_button = ctk.CTkButton(action_frame, text="1. Generate Styled Book", command=self.start_styling_thread, state="disabled")
         self.style_button.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
 
-        self.theme_menu = ctk.CTkOptionMenu(action_frame, values=["premium_novel", "formal_textbook"])
-        self.theme_menu.grid(row=0, column=1, padx=10, pady=10)
+        options_frame = ctk.CTkFrame(action_frame, fg_color="transparent")
+        options_frame.grid(row=0, column=1, padx=10, pady=10)
+        self.theme_menu = ctk.CTkOptionMenu(options_frame, values=list(StylingEngine.THEMES))
+        self.theme_menu.grid(row=0, column=0, padx=(0, 5))
+        # EPUB skips the browser entirely and suits e-readers; PDF is the print-ready 6x9in book.
+        self.format_menu = ctk.CTkOptionMenu(options_frame, values=["PDF", "EPUB"], width=80)
+        self.format_menu.grid(row=0, column=1)
 
         self.chat_button = ctk.CTkButton(action_frame, text="2. Chat with this Book", command=self.start_ai_ingestion_thread, state="disabled")
         self.chat_button.grid(row=0, column=2, padx=10, pady=10, sticky="ew")
@@ -118,33 +184,119 @@ class BookAlchemistApp(ctk.CTk):
         self.send_button = ctk.CTkButton(chat_frame, text="Send", command=self.send_message_thread, state="disabled")
         self.send_button.grid(row=1, column=1, padx=10, pady=10)
 
+        progress_frame = ctk.CTkFrame(self)
+        progress_frame.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
+        progress_frame.grid_columnconfigure(1, weight=1)
+        self.status_label = ctk.CTkLabel(progress_frame, text="Idle", text_color="gray", anchor="w", width=220)
+        self.status_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+        self.progress_bar = ctk.CTkProgressBar(progress_frame)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
+        self.cancel_button = ctk.CTkButton(progress_frame, text="Cancel", width=80, command=self.cancel_current_job, state="disabled")
+        self.cancel_button.grid(row=0, column=2, padx=10, pady=5)
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.event_pump.start()
         self.after(100, self.start_ai_initialization_thread)
 
     def open_settings(self):
         """Opens the settings pop-up window."""
         SettingsWindow(self, self.config_manager)
 
+    def open_stats(self):
+        """Opens the live pipeline metrics panel."""
+        StatsWindow(self)
+
+    def on_close(self):
+        """Cancels outstanding jobs and stops the event pump before closing."""
+        self.scheduler.shutdown()
+        self.event_pump.stop()
+        self.destroy()
+
+    # --- Progress reporting (main thread) ---
+
+    def _track_job(self, job, status, cancellable=True):
+        """Makes a job the one shown in the progress bar and, unless told otherwise, cancellable from the UI."""
+        if job is None:
+            return
+        self.progress_job = job
+        self.status_label.configure(text=status, text_color="white")
+        self.progress_bar.set(0)
+        self.cancel_button.configure(state="normal" if cancellable else "disabled")
+
+    def _on_progress(self, job, stage, fraction, message):
+        if job is not self.progress_job:
+            return
+        self.status_label.configure(text=message or f"{job.name}: {stage}")
+        if fraction is not None:
+            self.progress_bar.set(max(0.0, min(1.0, fraction)))
+
+    def _finish_progress(self, job, status="Idle"):
+        if job is not self.progress_job:
+            return
+        self.progress_job = None
+        self.status_label.configure(text=status, text_color="gray")
+        self.progress_bar.set(1 if status != "Idle" else 0)
+        self.cancel_button.configure(state="disabled")
+
+    def cancel_current_job(self):
+        if self.progress_job:
+            self.progress_job.cancel()
+            self.status_label.configure(text=f"Cancelling {self.progress_job.name}...")
+            self.cancel_button.configure(state="disabled")
+
+    def _on_cancelled(self, job):
+        self.add_message("System", f"⏹️ {job.name} cancelled.")
+        self._finish_progress(job, "Cancelled")
+
+    def _set_action_buttons(self, state):
+        self.style_button.configure(state=state)
+        self.chat_button.configure(state=state)
+
+    def _set_chat_input(self, state):
+        self.input_box.configure(state=state)
+        self.send_button.configure(state=state)
+
+    # --- AI initialization ---
+
     def start_ai_initialization_thread(self):
         """This function is called by the mainloop shortly after startup."""
-        threading.Thread(target=self._initialize_ai, daemon=True).start()
-
-    def _initialize_ai(self):
-        try:
-            provider = self.config_manager.get_provider()
-            
-            # --- THE FIX: Provide the provider name when getting the API key ---
-            # Now we ask the config manager for the specific key needed by the selected provider.
-            api_key = self.config_manager.get_api_key(provider)
-            
-            self.assistant = AIAssistant(provider=provider, api_key=api_key)
-            self.semantic_cache = SemanticCache(embedding_model=self.assistant.embeddings)
-            
-            self.select_button.configure(state="normal")
-            self.file_label.configure(text=f"AI Ready (Provider: {provider.upper()}). Please select a book.")
-        except Exception as e:
-            error_message = f"Error: AI Failed to Load. Check Settings. Details: {e}"
-            self.file_label.configure(text=error_message, text_color="red")
-            self.add_message("System", error_message)
+        job = self.scheduler.submit("AI initialization", self._initialize_ai, key="init",
+                                    on_done=self._on_ai_ready, on_error=self._on_ai_failed,
+                                    on_progress=self._on_progress)
+        # Nothing works without the models, so startup can't be cancelled halfway.
+        self._track_job(job, "Initializing AI...", cancellable=False)
+
+    def _initialize_ai(self, job):
+        provider = self.config_manager.get_provider()
+
+        # --- THE FIX: Provide the provider name when getting the API key ---
+        # Now we ask the config manager for the specific key needed by the selected provider.
+        api_key = self.config_manager.get_api_key(provider)
+
+        job.report("loading models", 0.1)
+        self.assistant = AIAssistant(provider=provider, api_key=api_key,
+                                     vector_backend=self.config_manager.get_vector_backend(),
+                                     vector_dtype=self.config_manager.get_vector_dtype(),
+                                     retrieval_mode=self.config_manager.get_retrieval_mode(),
+                                     local_model_options=self.config_manager.get_local_model_options())
+        job.report("opening cache", 0.9)
+        self.semantic_cache = SemanticCache(embedding_model=self.assistant.embeddings,
+                                            **self.config_manager.get_cache_options())
+        return provider
+
+    def _on_ai_ready(self, job, provider):
+        self.select_button.configure(state="normal")
+        self.file_label.configure(text=f"AI Ready (Provider: {provider.upper()}). Please select a book.")
+        self._finish_progress(job, "AI ready")
+
+    def _on_ai_failed(self, job, e):
+        error_message = f"Error: AI Failed to Load. Check Settings. Details: {e}"
+        self.file_label.configure(text=error_message, text_color="red")
+        self.add_message("System", error_message)
+        self._finish_progress(job, "AI failed to load")
+
+    # --- Parsing ---
 
     def select_book(self):
         path = filedialog.askopenfilename(
@@ -157,124 +309,219 @@ class BookAlchemistApp(ctk.CTk):
             ]
         )
         if path:
+            if self.parse_job:
+                if path == self.file_path and not self.parse_job.cancelled:
+                    # Same book again: let the running analysis finish rather than cancel it.
+                    self.add_message("System", f"{os.path.basename(path)} is already being analyzed.")
+                    return
+                # A newer selection replaces the book still being analyzed.
+                self.parse_job.cancel()
+            job = self.scheduler.submit("Analysis", self._parse_document_thread, path, key=("parse", path),
+                                        on_done=self._on_parse_done, on_error=self._on_parse_failed,
+                                        on_progress=self._on_progress, on_cancel=self._on_parse_cancelled)
+            if job is None:
+                self.add_message("System", f"{os.path.basename(path)} is already being analyzed.")
+                return
+            self.parse_job = job
             self.file_path = path
             self.file_label.configure(text=f"Selected: {os.path.basename(path)}", text_color="white")
             self.add_message("System", f"Selected book: {os.path.basename(path)}")
-            
-            self.style_button.configure(state="disabled")
-            self.chat_button.configure(state="disabled")
-            self.input_box.configure(state="disabled")
-            self.send_button.configure(state="disabled")
 
-            threading.Thread(target=self._parse_document_thread, daemon=True).start()
+            self._set_action_buttons("disabled")
+            self._set_chat_input("disabled")
+            self._track_job(job, "Analyzing document...")
 
-    def _parse_document_thread(self):
-        self.add_message("System", "Analyzing document...")
+    def _parse_document_thread(self, job, path_to_parse):
+        job.post(self.add_message, "System", "Analyzing document...")
         parser = None
-        path_to_parse = self.file_path
+        dominant_font = None
         try:
             if path_to_parse.lower().endswith('.pdf'):
                 parser = PDFParser(file_path=path_to_parse)
-                self.structured_content = parser.extract_structured_content()
-                self.dominant_font, _ = parser.find_dominant_font()
-                self.add_message("System", f"Dominant font found: {self.dominant_font or 'N/A'}")
+                structured_content = parser.extract_structured_content(progress_callback=job.report)
+                dominant_font, _ = parser.find_dominant_font()
+                job.post(self.add_message, "System", f"Dominant font found: {dominant_font or 'N/A'}")
             elif path_to_parse.lower().endswith('.epub'):
                 parser = EpubParser(file_path=path_to_parse)
-                self.structured_content = parser.extract_structured_content()
-                self.dominant_font = None
+                structured_content = parser.extract_structured_content(progress_callback=job.report)
             elif path_to_parse.lower().endswith('.mobi'):
+                job.report("converting MOBI", None)
                 converted_epub_path = convert_mobi_to_epub(path_to_parse)
-                if converted_epub_path:
-                    path_to_parse = converted_epub_path
-                    parser = EpubParser(file_path=path_to_parse)
-                    self.structured_content = parser.extract_structured_content()
-                    self.dominant_font = None
-                else:
-                    self.add_message("Error", "MOBI to EPUB conversion failed. Please check Calibre.")
-                    return
-            
+                if not converted_epub_path:
+                    raise RuntimeError("MOBI to EPUB conversion failed. Please check Calibre.")
+                parser = EpubParser(file_path=converted_epub_path)
+                structured_content = parser.extract_structured_content(progress_callback=job.report)
+            else:
+                raise ValueError("Unsupported file type.")
+        finally:
             if parser:
                 parser.close()
-                self.add_message("System", f"✅ Analysis complete. Ready for action.")
-                self.style_button.configure(state="normal")
-                self.chat_button.configure(state="normal")
-            else:
-                self.add_message("Error", f"Unsupported file type.")
-        except Exception as e:
-            self.add_message("Error", f"Failed to parse document: {e}")
+        return path_to_parse, structured_content, dominant_font
+
+    def _on_parse_done(self, job, result):
+        if job is self.parse_job:
+            self.parse_job = None
+        path, structured_content, dominant_font = result
+        if path != self.file_path:
+            # The user picked another book while this one was being analyzed.
+            return
+        self.structured_content = structured_content
+        self.dominant_font = dominant_font
+        self.add_message("System", f"✅ Analysis complete. Ready for action.")
+        self._set_action_buttons("normal")
+        self._finish_progress(job, "Analysis complete")
+
+    def _on_parse_failed(self, job, e):
+        if job is self.parse_job:
+            self.parse_job = None
+        self.add_message("Error", f"Failed to parse document: {e}")
+        self._finish_progress(job, "Analysis failed")
+
+    def _on_parse_cancelled(self, job):
+        if job is self.parse_job:
+            self.parse_job = None
+        self._on_cancelled(job)
+
+    # --- Styled PDF / EPUB ---
 
     def start_styling_thread(self):
-        self.style_button.configure(state="disabled")
-        self.chat_button.configure(state="disabled")
-        threading.Thread(target=self._run_styling_pipeline, daemon=True).start()
-
-    def _run_styling_pipeline(self):
+        theme = self.theme_menu.get()
+        output_format = self.format_menu.get()
+        book_id = os.path.splitext(os.path.basename(self.file_path))[0].lower().replace(" ", "_")
+        job = self.scheduler.submit(f"{output_format} generation", self._run_styling_pipeline, theme, book_id,
+                                    self.structured_content, self.dominant_font, output_format,
+                                    priority=PRIORITY_LOW, key="style",
+                                    on_done=self._on_styling_done, on_error=self._on_styling_failed,
+                                    on_progress=self._on_progress, on_cancel=self._on_styling_cancelled)
+        if job:
+            self._set_action_buttons("disabled")
+            self._track_job(job, f"Generating {output_format} with '{theme}' theme...")
+
+    def _run_styling_pipeline(self, job, theme, book_id, structured_content, dominant_font, output_format):
+        job.post(self.add_message, "System", f"Generating {output_format} with '{theme}' theme...")
+        base_path = os.path.join("output_docs", f"{book_id}_{theme}.{output_format.lower()}")
+        final_path = base_path
+        counter = 1
+        while os.path.exists(final_path):
+            name, ext = os.path.splitext(base_path)
+            final_path = f"{name} ({counter}){ext}"
+            counter += 1
+        if output_format == "EPUB":
+            job.report("writing EPUB", None)
+            with profiling.book_context(book_id):
+                if not EpubGenerator.generate_epub(structured_content, final_path, theme, book_id,
+                                                   dominant_font=dominant_font):
+                    raise RuntimeError("EPUB generation failed, see the console for details.")
+            return final_path
+
+        job.report("rendering HTML", 0.1)
+        engine = StylingEngine(structured_content=structured_content)
+        html = engine.generate_html(theme_name=theme, book_title=book_id, dominant_font=dominant_font)
+        job.report("printing PDF", 0.5)
+        loop = asyncio.new_event_loop()
         try:
-            theme = self.theme_menu.get()
-            book_id = os.path.splitext(os.path.basename(self.file_path))[0].lower().replace(" ", "_")
-            self.add_message("System", f"Generating PDF with '{theme}' theme...")
-            engine = StylingEngine(structured_content=self.structured_content)
-            html = engine.generate_html(theme_name=theme, book_title=book_id, dominant_font=self.dominant_font)
-            base_pdf_path = os.path.join("output_docs", f"{book_id}_{theme}.pdf")
-            final_pdf_path = base_pdf_path
-            counter = 1
-            while os.path.exists(final_pdf_path):
-                name, ext = os.path.splitext(base_pdf_path)
-                final_pdf_path = f"{name} ({counter}){ext}"
-                counter += 1
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(PDFGenerator.generate_pdf_from_html(html, final_pdf_path))
-            loop.close()
-            self.add_message("System", f"✅ PDF saved to {os.path.basename(final_pdf_path)}")
-        except Exception as e:
-            self.add_message("Error", f"Failed to generate PDF: {e}")
+            with profiling.book_context(book_id):
+                loop.run_until_complete(PDFGenerator.generate_pdf_from_html(html, final_path))
         finally:
-            self.style_button.configure(state="normal")
-            self.chat_button.configure(state="normal")
+            loop.close()
+        return final_path
 
-    def start_ai_ingestion_thread(self):
-        self.style_button.configure(state="disabled")
-        self.chat_button.configure(state="disabled")
-        threading.Thread(target=self._run_ai_ingestion, daemon=True).start()
+    def _on_styling_done(self, job, final_path):
+        self.add_message("System", f"✅ Book saved to {os.path.basename(final_path)}")
+        self._set_action_buttons("normal")
+        self._finish_progress(job, "Book saved")
 
-    def _run_ai_ingestion(self):
-        try:
-            self.active_ai_book_name = os.path.basename(self.file_path)
-            self.active_ai_book_id = os.path.splitext(self.active_ai_book_name)[0].lower().replace(" ", "_")
-            self.add_message("System", "AI is now studying the book...")
-            self.assistant.ingest_document(self.structured_content, self.active_ai_book_id)
-            self.add_message("System", f"✅ AI is ready! You can now ask questions about '{self.active_ai_book_name}'.")
-            self.input_box.configure(state="normal")
-            self.send_button.configure(state="normal")
-        except Exception as e:
-            self.add_message("Error", f"Could not load book into AI: {e}")
-        finally:
-            self.style_button.configure(state="normal")
-            self.chat_button.configure(state="normal")
+    def _on_styling_failed(self, job, e):
+        self.add_message("Error", f"Failed to generate the styled book: {e}")
+        self._set_action_buttons("normal")
+        self._finish_progress(job, "Styled book generation failed")
 
-    def send_message_thread(self, event=None):
-        if self.input_box.cget("state") == "normal":
-            threading.Thread(target=self.ask_ai, daemon=True).start()
+    def _on_styling_cancelled(self, job):
+        self._on_cancelled(job)
+        self._set_action_buttons("normal")
+
+    # --- AI ingestion ---
+
+    def start_ai_ingestion_thread(self):
+        book_name = os.path.basename(self.file_path)
+        book_id = os.path.splitext(book_name)[0].lower().replace(" ", "_")
+        job = self.scheduler.submit("Book ingestion", self._run_ai_ingestion, book_name, book_id,
+                                    self.structured_content, key="ingest",
+                                    on_done=self._on_ingestion_done, on_error=self._on_ingestion_failed,
+                                    on_progress=self._on_progress, on_cancel=self._on_ingestion_cancelled)
+        if job:
+            self._set_action_buttons("disabled")
+            self._set_chat_input("disabled")
+            self._track_job(job, "AI is studying the book...")
+
+    def _run_ai_ingestion(self, job, book_name, book_id, structured_content):
+        job.post(self.add_message, "System", "AI is now studying the book...")
+        rebuilt = self.assistant.ingest_document(structured_content, book_id, progress_callback=job.report)
+        if rebuilt:
+            # Answers cached against an older index of this book may no longer hold.
+            self.semantic_cache.invalidate_book(book_id)
+        return book_name, book_id
+
+    def _on_ingestion_done(self, job, result):
+        self.active_ai_book_name, self.active_ai_book_id = result
+        self.add_message("System", f"✅ AI is ready! You can now ask questions about '{self.active_ai_book_name}'.")
+        self._set_chat_input("normal")
+        self._set_action_buttons("normal")
+        self._finish_progress(job, "AI ready")
+
+    def _on_ingestion_failed(self, job, e):
+        self.add_message("Error", f"Could not load book into AI: {e}")
+        self._set_action_buttons("normal")
+        self._restore_chat_input()
+        self._finish_progress(job, "Ingestion failed")
+
+    def _on_ingestion_cancelled(self, job):
+        self._on_cancelled(job)
+        self._set_action_buttons("normal")
+        self._restore_chat_input()
+
+    def _restore_chat_input(self):
+        # The previously ingested book is still loaded, so questions about it can go on.
+        if self.active_ai_book_id:
+            self._set_chat_input("normal")
+
+    # --- Q&A ---
 
-    def ask_ai(self):
+    def send_message_thread(self, event=None):
+        if self.input_box.cget("state") != "normal":
+            return
         question = self.input_box.get()
         if not question.strip(): return
+        # Questions jump ahead of queued styling/ingestion work, and the "qa"
+        # key refuses a second question while one is still being answered.
+        job = self.scheduler.submit("Question", self.ask_ai, question, self.active_ai_book_id,
+                                    priority=PRIORITY_HIGH, key="qa",
+                                    on_done=self._on_answer, on_error=self._on_answer_failed)
+        if job is None:
+            return
         self.add_message("You", question)
         self.input_box.delete(0, 'end')
-        self.input_box.configure(state="disabled")
-        self.send_button.configure(state="disabled")
-        cached_answer = self.semantic_cache.get_similar_answer(self.active_ai_book_id, question)
+        self._set_chat_input("disabled")
+
+    def ask_ai(self, job, question, book_id):
+        cached_answer = self.semantic_cache.get_similar_answer(book_id, question)
         if cached_answer:
-            self.add_message("AI Assistant (from smart cache)", cached_answer)
-        else:
-            answer = self.assistant.ask(question)
-            self.semantic_cache.add_answer(self.active_ai_book_id, question, answer)
-            self.add_message("AI Assistant", answer)
-        self.input_box.configure(state="normal")
-        self.send_button.configure(state="normal")
+            return "AI Assistant (from smart cache)", cached_answer
+        answer = self.assistant.ask(question)
+        self.semantic_cache.add_answer(book_id, question, answer)
+        return "AI Assistant", answer
+
+    def _on_answer(self, job, result):
+        sender, answer = result
+        self.add_message(sender, answer)
+        self._set_chat_input("normal")
+
+    def _on_answer_failed(self, job, e):
+        self.add_message("Error", f"Could not answer the question: {e}")
+        self._set_chat_input("normal")
     
     def add_message(self, sender, message):
+        """Appends a message to the chat box. Must run on the main thread; workers use job.post()."""
         self.chatbox.configure(state="normal")
         self.chatbox.insert("end", f"{sender}:\n{message}\n\n")
         self.chatbox.configure(state="disabled")
@@ -284,4 +531,4 @@ if __name__ == "__main__":
     os.makedirs("output_docs", exist_ok=True)
     os.makedirs("chroma_cache", exist_ok=True)
     app = BookAlchemistApp()
-    app.mainloop()
\ No newline at end of file
+    app.mainloop()
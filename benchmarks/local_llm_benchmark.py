@@ -0,0 +1,59 @@
+# BookAlchemist/benchmarks/local_llm_benchmark.py
+#
+# Measures per-question latency of the local llama.cpp model with and
+# without reusing the KV cache of the static prompt prefix.
+#
+#   python -m benchmarks.local_llm_benchmark --threads 8 --batch-size 512
+
+import argparse
+import statistics
+import time
+
+from modules.local_llm import DEFAULT_MODEL_PATH, get_shared_llama
+
+PROMPT_TEMPLATE = """[INST]
+        Use the following pieces of context to answer the question at the end. If you don't know the answer from the context, just say that you don't know.
+        Context: {context}
+        Question: {question}
+        [/INST]"""
+
+
+def make_prompts(n):
+    context = "Elizabeth walked the three miles to Netherfield through the mud. " * 12
+    return [PROMPT_TEMPLATE.format(context=f"{context} (passage {i})", question=f"What happened in passage {i}?")
+            for i in range(n)]
+
+
+def time_prompts(model, prompts, max_tokens, reuse_prefix):
+    prefix = PROMPT_TEMPLATE.split("{context}")[0]
+    latencies = []
+    for prompt in prompts:
+        if reuse_prefix:
+            model.prime_prefix(prefix)
+        else:
+            model.client.reset()
+            model.prefix_tokens = []
+        start = time.perf_counter()
+        model.complete(prompt, max_tokens=max_tokens, temperature=0.0)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local llama.cpp prompt-prefix reuse.")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--max-tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    model = get_shared_llama(model_path=args.model_path, n_threads=args.threads, n_batch=args.batch_size, n_gpu_layers=0)
+    prompts = make_prompts(args.questions)
+    for label, reuse in (("no prefix reuse", False), ("prefix reuse", True)):
+        latencies = time_prompts(model, prompts, args.max_tokens, reuse)
+        print(f"{label:>16}: median {statistics.median(latencies):.2f}s, mean {statistics.mean(latencies):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# BookAlchemist/benchmarks/pipeline_benchmark.py
+#
+# End-to-end pipeline benchmark on synthetic books: PDF and EPUB parsing,
+# HTML styling, Chromium PDF rendering, the semantic cache, and ingestion and
+# Q&A with the deterministic "fake" AI provider, so it runs fully offline.
+# Each stage reports its median/min wall time over several runs and the peak
+# Python heap from one extra traced run. Stages whose dependencies are not
+# installed are reported as skipped.
+#
+#   python -m benchmarks.pipeline_benchmark run --pages 300 --json current.json
+#   python -m benchmarks.pipeline_benchmark compare baseline.json current.json --threshold 0.15
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic_books import make_epub, make_pdf
+
+STAGES = ("pdf_parse", "epub_parse", "styling", "pdf_render", "semantic_cache", "ingest", "qa")
+QUESTIONS = ["Who walked to the estate?", "What happened at the ball?", "Describe the garden.",
+             "What did the letter say?", "Who is the gentleman?"]
+
+
+def measure(func, repeats, setup=None, verbose=False):
+    """Times func() `repeats` times, then runs it once more under tracemalloc for the peak heap."""
+    if not verbose:
+        # The modules print progress (and every cache hit); keep that out of the timings and output.
+        quiet = func
+
+        def func():
+            with contextlib.redirect_stdout(io.StringIO()):
+                quiet()
+    runs = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median_s": round(statistics.median(runs), 4), "min_s": round(min(runs), 4),
+            "runs_s": [round(run, 4) for run in runs], "peak_mb": round(peak / 2**20, 2)}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(rss / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+class PipelineBenchmark:
+    def __init__(self, workdir, args):
+        self.workdir = workdir
+        self.args = args
+        self.pdf_path = os.path.join(workdir, "synthetic.pdf")
+        self.epub_path = os.path.join(workdir, "synthetic.epub")
+        self.pdf_content = None
+        self.assistant = None
+
+    def prepare(self):
+        make_pdf(self.pdf_path, pages=self.args.pages, chapters=self.args.chapters,
+                 image_density=self.args.image_density, seed=self.args.seed)
+        make_epub(self.epub_path, chapters=self.args.chapters,
+                  paragraphs_per_chapter=max(1, self.args.pages * 4 // max(1, self.args.chapters)),
+                  image_density=self.args.image_density, seed=self.args.seed)
+
+    # --- Stages: each returns (func, setup) or raises ImportError to be skipped ---
+
+    def stage_pdf_parse(self):
+        from modules.pdf_parser import PDFParser
+
+        def run():
+            parser = PDFParser(self.pdf_path, image_output_dir=os.path.join(self.workdir, "output_docs", "images"))
+            try:
+                self.pdf_content = parser.extract_structured_content()
+                parser.find_dominant_font()
+            finally:
+                parser.close()
+        return run, None
+
+    def stage_epub_parse(self):
+        from modules.epub_parser import EpubParser
+        return (lambda: EpubParser(self.epub_path).extract_structured_content()), None
+
+    def _content(self):
+        if self.pdf_content is None:
+            self.stage_pdf_parse()[0]()
+        return self.pdf_content
+
+    def stage_styling(self):
+        from modules.styling_engine import StylingEngine
+        content = self._content()
+        return (lambda: StylingEngine(content).generate_html("premium_novel", "synthetic")), None
+
+    def stage_pdf_render(self):
+        import playwright  # noqa: F401  (skip cleanly when it isn't installed)
+        from modules.styling_engine import StylingEngine
+        from modules.pdf_generator import PDFGenerator
+        html = StylingEngine(self._content()).generate_html("premium_novel", "synthetic")
+        output_path = os.path.join(self.workdir, "synthetic_render.pdf")
+
+        def run():
+            if not asyncio.run(PDFGenerator.generate_pdf_from_html(html, output_path)):
+                raise RuntimeError("PDF generation failed.")
+        return run, None
+
+    def stage_semantic_cache(self):
+        from modules.cache_manager import SemanticCache
+        from modules.fake_providers import FakeEmbeddings
+        embeddings = FakeEmbeddings()
+        paragraphs = [block['content'] for block in self._content() if block['type'] == 'paragraph']
+        questions = [f"What does this say: {text[:80]}" for text in paragraphs[:self.args.cache_entries]]
+        cache_file = os.path.join(self.workdir, "semantic_cache.db")
+
+        def setup():
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(cache_file + suffix):
+                    os.remove(cache_file + suffix)
+
+        def run():
+            cache = SemanticCache(embeddings, cache_file=cache_file,
+                                  legacy_cache_file=os.path.join(self.workdir, "missing.json"))
+            for question in questions:
+                cache.add_answer("synthetic", question, "An answer.")
+            for question in questions[:self.args.cache_lookups]:
+                cache.get_similar_answer("synthetic", question.replace("What", "what"))
+        return run, setup
+
+    def _assistant(self):
+        if self.assistant is None:
+            from modules.ai_assistant import AIAssistant
+            self.assistant = AIAssistant(provider="fake", vector_backend="memmap")
+        return self.assistant
+
+    def stage_ingest(self):
+        assistant = self._assistant()
+        content = self._content()
+
+        def setup():
+            if assistant._get_vector_store().has_book("synthetic"):
+                assistant.delete_book("synthetic")
+        return (lambda: assistant.ingest_document(content, "synthetic")), setup
+
+    def stage_qa(self):
+        assistant = self._assistant()
+        if not assistant._get_vector_store().has_book("synthetic"):
+            assistant.ingest_document(self._content(), "synthetic")
+        assistant.set_active_books(["synthetic"])
+        # ask() turns failures into an answer string; a timing of an error path is worthless.
+        answer = assistant.ask(QUESTIONS[0])
+        if answer.startswith(("An error occurred", "Error:")):
+            raise RuntimeError(f"ask() failed end to end: {answer}")
+        return (lambda: list(assistant.ask_many(QUESTIONS))), None
+
+    def run(self, stages):
+        results = {}
+        for name in stages:
+            try:
+                func, setup = getattr(self, f"stage_{name}")()
+            except ImportError as e:
+                results[name] = {"skipped": f"missing dependency: {e.name}"}
+                print(f"⏭️  {name}: skipped ({e.name} is not installed)")
+                continue
+            try:
+                results[name] = measure(func, self.args.repeats, setup, self.args.verbose)
+            except Exception as e:
+                results[name] = {"error": str(e)}
+                print(f"❌ {name}: {e}")
+                continue
+            print(f"✅ {name}: median {results[name]['median_s']:.3f}s, peak heap {results[name]['peak_mb']} MB")
+        return results
+
+
+def run_command(args):
+    stages = args.stages or list(STAGES)
+    workdir = tempfile.mkdtemp(prefix="bookalchemist_bench_")
+    cwd = os.getcwd()
+    try:
+        # Modules that write next to the working directory (vector store, images) stay in the temp folder.
+        os.chdir(workdir)
+        benchmark = PipelineBenchmark(workdir, args)
+        print(f"⏳ Generating a {args.pages}-page synthetic book...")
+        benchmark.prepare()
+        results = benchmark.run(stages)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpu_count": os.cpu_count(), "peak_rss_mb": peak_rss_mb()},
+        "params": {key: getattr(args, key) for key in
+                   ("pages", "chapters", "image_density", "seed", "repeats", "cache_entries", "cache_lookups")},
+        "stages": results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=4)
+        print(f"Results saved to {args.json}")
+    failed = [name for name, result in results.items() if "error" in result]
+    if failed:
+        print(f"❌ Stages failed: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+def compare_reports(baseline, current, threshold, memory_threshold, min_seconds):
+    """
+    Returns one row per timed baseline stage, with regression flags.
+    Times are compared on the best run, which is the least noisy statistic.
+    A stage that errored or is missing from the current run gets a "failure"
+    row instead; one skipped for a missing dependency is only reported.
+    """
+    rows = []
+    for name, base in baseline["stages"].items():
+        now = current["stages"].get(name, {})
+        if "min_s" not in base:
+            continue
+        if "skipped" in now:
+            print(f"⚠️ {name}: no timing in the current run ({now['skipped']}).")
+            continue
+        if "min_s" not in now:
+            rows.append({"stage": name, "failure": now.get("error") or "not run"})
+            continue
+        time_ratio = now["min_s"] / base["min_s"] if base["min_s"] else 1.0
+        memory_ratio = now["peak_mb"] / base["peak_mb"] if base["peak_mb"] else 1.0
+        rows.append({
+            "stage": name, "baseline_s": base["min_s"], "current_s": now["min_s"],
+            "time_ratio": round(time_ratio, 3), "memory_ratio": round(memory_ratio, 3),
+            # Tiny absolute differences are timer noise, not regressions.
+            "time_regression": time_ratio > 1 + threshold and now["min_s"] - base["min_s"] > min_seconds,
+            "memory_regression": memory_ratio > 1 + memory_threshold,
+        })
+    return rows
+
+
+def compare_command(args):
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+    if baseline.get("params") != current.get("params"):
+        print("⚠️ The two runs used different parameters, ratios may not be meaningful.")
+    rows = compare_reports(baseline, current, args.threshold, args.memory_threshold, args.min_seconds)
+    print(f"{'stage':<16}{'baseline':>10}{'current':>10}{'time':>8}{'memory':>8}   (best run, peak heap)")
+    failures = [row for row in rows if "failure" in row]
+    rows = [row for row in rows if "failure" not in row]
+    for row in rows:
+        flag = " ⚠️ REGRESSION" if row["time_regression"] or row["memory_regression"] else ""
+        print(f"{row['stage']:<16}{row['baseline_s']:>9.3f}s{row['current_s']:>9.3f}s"
+              f"{row['time_ratio']:>7.2f}x{row['memory_ratio']:>7.2f}x{flag}")
+    for row in failures:
+        print(f"{row['stage']:<16}{'':>10}{'—':>10}   ❌ {row['failure']}")
+    regressions = [row["stage"] for row in rows if row["time_regression"] or row["memory_regression"]]
+    if regressions:
+        print(f"❌ Regressions in: {', '.join(regressions)}")
+    if failures:
+        print(f"❌ No timing in the current run for: {', '.join(row['stage'] for row in failures)}")
+    if regressions or failures:
+        return 1
+    print("✅ No regressions.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmarks on synthetic books.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmark suite.")
+    run.add_argument("--pages", type=int, default=100)
+    run.add_argument("--chapters", type=int, default=10)
+    run.add_argument("--image-density", type=float, default=0.2, help="Images per page (can be fractional).")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--repeats", type=int, default=3)
+    run.add_argument("--cache-entries", type=int, default=500)
+    run.add_argument("--cache-lookups", type=int, default=200)
+    run.add_argument("--stages", nargs="+", choices=STAGES, help="Only run these stages.")
+    run.add_argument("--json", help="Path to write the results as JSON.")
+    run.add_argument("--verbose", action="store_true", help="Show the modules' own progress output.")
+
+    compare = subparsers.add_parser("compare", help="Compare a run against a baseline.")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown, 0.15 = 15%%.")
+    compare.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed peak heap growth.")
+    compare.add_argument("--min-seconds", type=float, default=0.005, help="Ignore slowdowns smaller than this.")
+
+    args = parser.parse_args()
+    sys.exit(run_command(args) if args.command == "run" else compare_command(args))
+
+
+if __name__ == "__main__":
+    main()
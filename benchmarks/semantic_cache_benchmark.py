@@ -0,0 +1,90 @@
+# BookAlchemist/benchmarks/semantic_cache_benchmark.py
+#
+# Lookup latency of the semantic cache at 1k, 10k and 100k cached questions:
+# the old approach (rebuild an array from Python lists and call sklearn's
+# cosine_similarity on every lookup), the pre-normalized matrix, and the
+# approximate IVF index used for very large books.
+#
+#   python -m benchmarks.semantic_cache_benchmark --sizes 1000 10000 100000
+
+import argparse
+import json
+import time
+import numpy as np
+
+from modules.cache_manager import _CachedBook
+
+
+def legacy_lookup(vectors_as_lists, query):
+    from sklearn.metrics.pairwise import cosine_similarity
+    cached_vectors = np.array(vectors_as_lists)
+    similarities = cosine_similarity(np.array(query).reshape(1, -1), cached_vectors)[0]
+    return int(np.argmax(similarities))
+
+
+def time_lookups(lookup, queries):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(lookup(query))
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1000, results
+
+
+def run_size(size, dim, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(size, dim)).astype(np.float32)
+    # Queries are noisy paraphrases of cached questions, like real cache hits.
+    targets = rng.integers(0, size, n_queries)
+    queries = vectors[targets] + 0.05 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    result = {"size": size, "dim": dim}
+
+    exact = _CachedBook(dim, approx_threshold=size + 1)
+    start = time.perf_counter()
+    for i, vector in enumerate(vectors):
+        exact.add(f"q{i}", f"a{i}", vector, 0.0)
+    result["insert_total_s"] = round(time.perf_counter() - start, 3)
+    exact_ms, exact_rows = time_lookups(lambda q: exact.most_similar(q)[0], queries)
+    result["matrix_p50_ms"] = round(float(np.median(exact_ms)), 3)
+
+    approx = _CachedBook(dim, approx_threshold=1)
+    approx.matrix, approx.size = exact.matrix, exact.size
+    start = time.perf_counter()
+    approx._refresh_index()
+    result["ivf_build_s"] = round(time.perf_counter() - start, 3)
+    approx_ms, approx_rows = time_lookups(lambda q: approx.most_similar(q)[0], queries)
+    result["ivf_p50_ms"] = round(float(np.median(approx_ms)), 3)
+    result["ivf_recall"] = round(float(np.mean(np.array(approx_rows) == np.array(exact_rows))), 4)
+
+    try:
+        as_lists = vectors.tolist()
+        legacy_ms, _ = time_lookups(lambda q: legacy_lookup(as_lists, q), queries[:20])
+        result["legacy_p50_ms"] = round(float(np.median(legacy_ms)), 3)
+    except ImportError:
+        result["legacy_p50_ms"] = None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic cache lookups.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        print(f"⏳ Benchmarking {size} cached questions...")
+        results.append(run_size(size, args.dim, args.queries))
+        print(json.dumps(results[-1]))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
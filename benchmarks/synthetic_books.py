@@ -0,0 +1,138 @@
+# BookAlchemist/benchmarks/synthetic_books.py
+#
+# Deterministic synthetic books for the pipeline benchmarks: a PDF built with
+# PyMuPDF and an EPUB written straight into a zip, both with a configurable
+# number of pages/paragraphs, chapters and images. The same seed always
+# produces the same book, so timings are comparable between runs.
+
+import zipfile
+import numpy as np
+
+WORDS = (
+    "the of and to in a was that he she it with as his her had for at which by on not be "
+    "from but have were they this all been their one so an would when who there what said "
+    "letter house morning evening sister brother father mother country town walk garden "
+    "fortune marriage manners pride opinion character conversation acquaintance regiment "
+    "estate carriage ball dance visit family friend neighbour gentleman lady society"
+).split()
+
+BOOK_TITLE = "A Synthetic Novel"
+
+
+def _paragraph(rng, min_words=60, max_words=120):
+    words = rng.choice(WORDS, size=int(rng.integers(min_words, max_words))).tolist()
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def _png(rng, width=160, height=120):
+    """A small noisy RGB image; noise keeps every image distinct so none are de-duplicated."""
+    import fitz
+    base = rng.integers(0, 256, size=3, dtype=np.uint8)
+    noise = rng.integers(0, 48, size=(height, width, 3), dtype=np.uint8)
+    pixels = np.clip(base.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    return fitz.Pixmap(fitz.csRGB, width, height, pixels.tobytes(), False).tobytes("png")
+
+
+def _images_on(index, density):
+    # Spreads a fractional density evenly, e.g. 0.25 -> one image every fourth page.
+    return int((index + 1) * density) - int(index * density)
+
+
+def _insert_paragraph(page, y, text, bottom=600, min_words=10):
+    """
+    Writes a paragraph at y in the space left above `bottom`, dropping words
+    from its end until it fits, and returns the y for the next paragraph.
+    """
+    import fitz
+    words = text.split()
+    while len(words) >= min_words:
+        paragraph = " ".join(words).rstrip(".") + "."
+        # insert_textbox writes nothing when the text doesn't fit and returns the shortfall.
+        spare = page.insert_textbox(fitz.Rect(54, y, 378, bottom), paragraph, fontsize=10)
+        if spare >= 0:
+            return bottom - spare + 6
+        words = words[:len(words) * 3 // 4]
+    return bottom
+
+
+def make_pdf(path, pages=100, chapters=10, image_density=0.2, seed=0):
+    """
+    Writes a 6x9in PDF with a running header and page number on every page,
+    a CHAPTER heading every pages/chapters pages, and captioned images.
+    """
+    import fitz
+    rng = np.random.default_rng(seed)
+    doc = fitz.open()
+    pages_per_chapter = max(1, pages // max(1, chapters))
+    figure = 0
+    for page_num in range(pages):
+        page = doc.new_page(width=432, height=648)
+        page.insert_text((54, 36), BOOK_TITLE, fontsize=8)
+        page.insert_text((210, 624), str(page_num + 1), fontsize=8)
+        y = 60
+        if page_num % pages_per_chapter == 0:
+            page.insert_text((54, y + 24), f"CHAPTER {page_num // pages_per_chapter + 1}", fontsize=16)
+            y += 48
+        for _ in range(_images_on(page_num, image_density)):
+            figure += 1
+            rect = fitz.Rect(126, y, 306, y + 135)
+            page.insert_image(rect, stream=_png(rng))
+            page.insert_textbox(fitz.Rect(54, y + 140, 378, y + 170), f"Figure {figure}: the garden at the estate.",
+                                fontsize=9, align=1)
+            y += 180
+        while y < 540:
+            y = _insert_paragraph(page, y, _paragraph(rng))
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_epub(path, chapters=10, paragraphs_per_chapter=40, image_density=0.2, seed=0):
+    """Writes a minimal EPUB 3 with one XHTML file per chapter and PNG images."""
+    rng = np.random.default_rng(seed)
+    manifest, spine, nav_items = [], [], []
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/container.xml", """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>""")
+        image_count = 0
+        for chapter in range(chapters):
+            body = [f"<h1>Chapter {chapter + 1}</h1>"]
+            for index in range(paragraphs_per_chapter):
+                if index and index % 15 == 0:
+                    body.append(f"<h3>Part {index // 15}</h3>")
+                for _ in range(_images_on(chapter * paragraphs_per_chapter + index, image_density / 4)):
+                    image_count += 1
+                    name = f"images/img{image_count}.png"
+                    zf.writestr(f"OEBPS/{name}", _png(rng))
+                    manifest.append(f'<item id="img{image_count}" href="{name}" media-type="image/png"/>')
+                    body.append(f'<img src="{name}" alt="Figure {image_count}"/>')
+                body.append(f"<p>{_paragraph(rng)}</p>")
+            name = f"chapter{chapter + 1}.xhtml"
+            zf.writestr(f"OEBPS/{name}", f"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml"><head><title>Chapter {chapter + 1}</title></head>
+<body>{"".join(body)}</body></html>""")
+            manifest.append(f'<item id="ch{chapter + 1}" href="{name}" media-type="application/xhtml+xml"/>')
+            spine.append(f'<itemref idref="ch{chapter + 1}"/>')
+            nav_items.append(f'<li><a href="{name}">Chapter {chapter + 1}</a></li>')
+        zf.writestr("OEBPS/nav.xhtml", f"""<?xml version="1.0" encoding="UTF-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops"><head><title>Contents</title></head>
+<body><nav epub:type="toc"><ol>{"".join(nav_items)}</ol></nav></body></html>""")
+        zf.writestr("OEBPS/content.opf", f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">synthetic-{seed}</dc:identifier>
+    <dc:title>{BOOK_TITLE}</dc:title>
+    <dc:language>en</dc:language>
+    <meta property="dcterms:modified">2024-01-01T00:00:00Z</meta>
+  </metadata>
+  <manifest>
+    <item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>
+    {"".join(manifest)}
+  </manifest>
+  <spine>{"".join(spine)}</spine>
+</package>""")
+    return path
@@ -0,0 +1,119 @@
+# BookAlchemist/benchmarks/vector_store_benchmark.py
+#
+# Compares the Chroma and memory-mapped vector store backends on the same
+# synthetic "book": open time, build time, query latency and recall@k
+# against an exact float32 search.
+#
+#   python -m benchmarks.vector_store_benchmark --chunks 5000 --dim 384
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from modules.vector_store import ChromaLibraryStore
+from modules.memmap_store import MemmapLibraryStore
+
+
+class LookupEmbeddings:
+    """Returns precomputed vectors so the benchmark never runs a real model."""
+    def __init__(self, table):
+        self.table = table
+
+    def embed_documents(self, texts):
+        return [self.table[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.table[text]
+
+
+def make_dataset(n_chunks, n_queries, dim, seed=0):
+    # Clustered vectors look more like real sentence embeddings than pure noise.
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n_chunks // 50), dim))
+    chunks = centers[rng.integers(0, len(centers), n_chunks)] + 0.5 * rng.normal(size=(n_chunks, dim))
+    queries = chunks[rng.integers(0, n_chunks, n_queries)] + 0.3 * rng.normal(size=(n_queries, dim))
+    chunks /= np.linalg.norm(chunks, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return chunks.astype(np.float32), queries.astype(np.float32)
+
+
+def make_store(backend, embeddings, path):
+    if backend == "chroma":
+        return ChromaLibraryStore(embeddings, persist_directory=path)
+    if backend.startswith("memmap-"):
+        return MemmapLibraryStore(embeddings, persist_directory=path, dtype=backend.split("-", 1)[1])
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def run_backend(backend, chunks, queries, k, workdir):
+    texts = [f"chunk-{i}" for i in range(len(chunks))]
+    query_texts = [f"query-{i}" for i in range(len(queries))]
+    table = dict(zip(texts, chunks.tolist()))
+    table.update(zip(query_texts, queries.tolist()))
+    embeddings = LookupEmbeddings(table)
+    path = os.path.join(workdir, backend)
+
+    start = time.perf_counter()
+    make_store(backend, embeddings, path).add_book("bench", texts)
+    build_s = time.perf_counter() - start
+
+    # Measure opening a fresh store, as the app does on startup.
+    start = time.perf_counter()
+    store = make_store(backend, embeddings, path)
+    retriever = store.as_retriever(["bench"], k=k)
+    retriever.invoke(query_texts[0])
+    open_s = time.perf_counter() - start
+
+    truth = np.argsort(-(chunks @ queries.T), axis=0)[:k].T
+    latencies, hits = [], 0
+    for i, query_text in enumerate(query_texts):
+        start = time.perf_counter()
+        docs = retriever.invoke(query_text)
+        latencies.append(time.perf_counter() - start)
+        found = {int(doc.page_content.split("-")[1]) for doc in docs}
+        hits += len(found & set(truth[i].tolist()))
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "backend": backend,
+        "build_s": round(build_s, 3),
+        "open_first_query_ms": round(open_s * 1000, 2),
+        "query_p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "query_p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        f"recall_at_{k}": round(hits / (len(queries) * k), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vector store backends.")
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "memmap-float16", "memmap-int8"])
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    chunks, queries = make_dataset(args.chunks, args.queries, args.dim)
+    workdir = tempfile.mkdtemp(prefix="bookalchemist_vs_")
+    results = []
+    try:
+        for backend in args.backends:
+            print(f"⏳ Benchmarking {backend}...")
+            results.append(run_backend(backend, chunks, queries, args.k, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for result in results:
+        print(json.dumps(result))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,122 @@
 # BookAlchemist/main.py
 
+import argparse
+import functools
 import os
-import asyncio
-from modules.pdf_parser import PDFParser
+import sys
 from modules.styling_engine import StylingEngine
-from modules.pdf_generator import PDFGenerator
-from modules.ai_assistant import AIAssistant
+from modules.batch_processor import OUTPUT_FORMATS, BatchProcessor, discover_books
+from modules import profiling
+
 
 def main():
     """
-    Main entry point for the application.
-    Sets up the document path and calls the processing function.
+    Command-line entry point.
+      python main.py batch input_docs/ --themes premium_novel formal_textbook --format pdf epub
+      python main.py chat pride-and-prejudice
+      python main.py serve --port 8765
     """
-    INPUT_DOC_NAME = "pride-and-prejudice.pdf"  # <-- CHANGE THIS to your PDF's filename
-    
-    doc_path = os.path.join("input_docs", INPUT_DOC_NAME)
+    parser = argparse.ArgumentParser(description="Book Alchemist headless tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="Parse, render and index a whole library.")
+    batch.add_argument("inputs", nargs="+", help="Book files, folders, or .txt/.json manifests listing book paths.")
+    batch.add_argument("--output-dir", default=os.path.join("output_docs", "batch"))
+    batch.add_argument("--themes", nargs="+", default=["premium_novel"], choices=StylingEngine.THEMES)
+    batch.add_argument("--parse-workers", type=int, default=None, help="Parser processes (default: CPU count - 1).")
+    batch.add_argument("--format", dest="formats", nargs="+", default=["pdf"], choices=OUTPUT_FORMATS,
+                       help="Styled output formats; EPUB needs no browser and is much faster.")
+    batch.add_argument("--render-workers", type=int, default=1, help="Chromium render processes.")
+    batch.add_argument("--no-render", action="store_true", help="Skip the styled output stage.")
+    batch.add_argument("--no-ingest", action="store_true", help="Skip adding books to the AI library index.")
+    batch.add_argument("--force", action="store_true", help="Redo every stage, even if already done.")
+
+    chat = subparsers.add_parser("chat", help="Ask questions about a book that is already indexed.")
+    chat.add_argument("book_ids", nargs="+", help="Book IDs (file name without extension, lowercase, '_' for spaces).")
+
+    serve = subparsers.add_parser("serve", help="Run the local HTTP service.")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--output-dir", default=os.path.join("output_docs", "server"))
+    serve.add_argument("--parse-workers", type=int, default=2)
+    serve.add_argument("--render-workers", type=int, default=1)
+    serve.add_argument("--ask-workers", type=int, default=4, help="Concurrent answers (always 1 for the local model).")
+    serve.add_argument("--max-waiting", type=int, default=8, help="Queued requests per stage before answering 503.")
+    serve.add_argument("--provider", choices=["local", "openai", "perplexity", "fake"], default=None,
+                       help="Override the configured AI provider ('fake' needs no model or key).")
 
-    # Ensure output directory exists
-    os.makedirs("output_docs", exist_ok=True)
+    for command in (batch, serve):
+        command.add_argument("--profile", metavar="MODES", type=profiling.parse_modes,
+                             help=f"Profile each stage per book: a comma list of {', '.join(profiling.MODES)}, or 'all'.")
+        command.add_argument("--profile-dir", default=None, help="Where profile artifacts go (default: profiles).")
 
-    if not os.path.exists(doc_path):
-        print(f"Error: The file was not found at {doc_path}")
-        print("Please make sure the file exists in the 'input_docs' directory and the filename is correct.")
+    args = parser.parse_args()
+    if getattr(args, "profile", None):
+        # Set before any worker process starts, so parse/render workers profile too.
+        profiling.configure(args.profile, args.profile_dir)
+    if args.command == "batch":
+        sys.exit(run_batch(args))
+    if args.command == "serve":
+        run_serve(args)
         return
+    run_chat(args.book_ids)
 
-    process_book(doc_path)
 
+def run_batch(args):
+    """Runs the batch pipeline and returns a process exit code (1 if any stage failed)."""
+    sources = discover_books(args.inputs)
+    if not sources:
+        print("No PDF, EPUB or MOBI files were found.")
+        return 1
+    print(f"--- 🚀 Processing {len(sources)} book(s) into {args.output_dir} ---")
+    processor = BatchProcessor(args.output_dir, themes=args.themes, parse_workers=args.parse_workers,
+                               render_workers=args.render_workers, render=not args.no_render,
+                               ingest=not args.no_ingest, force=args.force, formats=args.formats)
+    processor.run(sources)
+    summary = processor.summary()
+    print(f"\n--- Batch finished: {summary} ---")
+    print(f"Results and timings: {processor.manifest.path}")
+    return 1 if summary.get("failed") else 0
 
-def process_book(file_path):
-    """
-    Runs the full pipeline: Parse -> Style -> Generate PDF -> Initialize AI.
-    """
-    print(f"--- 🚀 Starting to process: {os.path.basename(file_path)} ---")
 
-    # --- Step 1: Parsing the PDF ---
-    print("\n--- Step 1: Parsing Document ---")
-    parser = PDFParser(file_path=file_path)
-    try:
-        # This is the structured content we will use for everything else.
-        structured_content = parser.extract_structured_content()
-        print(f"✅ Successfully parsed {len(structured_content)} content blocks.")
-    except Exception as e:
-        print(f"❌ Critical Error during parsing: {e}")
-        print("Aborting process.")
-        return
-    finally:
-        parser.close()
+def run_serve(args):
+    from modules.batch_processor import default_assistant_factory
+    from modules.http_server import run_server
+    run_server(args.host, args.port, output_dir=args.output_dir, parse_workers=args.parse_workers,
+               render_workers=args.render_workers, ask_workers=args.ask_workers, max_waiting=args.max_waiting,
+               assistant_factory=functools.partial(default_assistant_factory, args.provider))
 
-    if not structured_content:
-        print("No content was extracted from the document. Aborting.")
-        return
 
-    # --- Step 2: Styling and PDF Generation ---
-    print("\n--- Step 2: Generating Styled PDFs ---")
-    engine = StylingEngine(structured_content=structured_content)
-    book_title = os.path.splitext(os.path.basename(file_path))[0]
-    
-    themes_to_generate = ["classic_scholar", "procedural_vintage"]
-    
-    for theme in themes_to_generate:
-        print(f"\nProcessing theme: {theme}")
-        try:
-            # Generate HTML
-            final_html = engine.generate_html(theme_name=theme, book_title=book_title)
-            
-            # Generate PDF from HTML
-            pdf_output_path = os.path.join("output_docs", f"{book_title}_{theme}.pdf")
-            print(f"⏳ Generating PDF, this may take a moment...")
-            
-            success = asyncio.run(PDFGenerator.generate_pdf_from_html(final_html, pdf_output_path))
-            
-            if success:
-                print(f"✅ Saved stylized PDF to: {pdf_output_path}")
-            else:
-                print(f"❌ Failed to generate PDF for theme: {theme}")
-
-        except Exception as e:
-            print(f"❌ An error occurred during processing for theme '{theme}': {e}")
-            continue # Continue to the next theme if one fails
-
-    # --- Step 3: Initialize and Interact with AI Assistant ---
-    print("\n--- Step 3: Initializing Conversational AI ---")
+def run_chat(book_ids):
+    """Conversational mode over books that a batch run (or the app) already indexed."""
+    from modules.batch_processor import default_assistant_factory
     try:
-        # We pass the 'structured_content' we successfully parsed in Step 1
-        assistant = AIAssistant(structured_content=structured_content)
-        
-        print("\n--- 📖 Conversational Mode Activated ---")
-        print("Ask anything about the book. Type 'exit' to quit.")
-        
-        while True:
-            question = input("\nYour question: ")
-            if question.lower().strip() == 'exit':
-                print("Exiting conversational mode. Goodbye! 👋")
-                break
-            
-            answer = assistant.ask(question)
-            print(f"\nAI Assistant: {answer}")
-
+        assistant, semantic_cache = default_assistant_factory()
+        assistant.set_active_books(book_ids)
     except Exception as e:
         print(f"\n❌ Could not initialize AI Assistant: {e}")
-        print("Please check your OpenAI API key and environment setup in the .env file.")
+        print("Please check the provider and API keys in config.json.")
+        return
+
+    print("\n--- 📖 Conversational Mode Activated ---")
+    print("Ask anything about the book. Type 'exit' to quit.")
+    cache_key = book_ids[0] if len(book_ids) == 1 else None
+    while True:
+        question = input("\nYour question: ")
+        if question.lower().strip() == 'exit':
+            print("Exiting conversational mode. Goodbye! 👋")
+            break
+        if not question.strip():
+            continue
+        cached_answer = semantic_cache.get_similar_answer(cache_key, question) if cache_key else None
+        if cached_answer:
+            print(f"\nAI Assistant (from smart cache): {cached_answer}")
+            continue
+        answer = assistant.ask(question)
+        if cache_key:
+            semantic_cache.add_answer(cache_key, question, answer)
+        print(f"\nAI Assistant: {answer}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
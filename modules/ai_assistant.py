@@ -1,32 +1,61 @@
 # BookAlchemist/modules/ai_assistant.py
 
-import os
-from langchain.chains import RetrievalQA
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.prompts import PromptTemplate
-from langchain_chroma import Chroma
+from modules.vector_store import create_vector_store
+from modules.lexical_index import LexicalLibraryIndex
+from modules.retrieval import HybridRetriever
+from modules.embedding_cache import CachedEmbeddings
+from modules import instrumentation, profiling
+from modules.boilerplate import is_boilerplate, without_boilerplate
 
 class AIAssistant:
-    def __init__(self, provider="local", api_key=None):
+    def __init__(self, provider="local", api_key=None, vector_backend="chroma", retrieval_mode="hybrid",
+                 local_model_options=None, load_llm=True, vector_dtype="float16"):
+        """
+        load_llm=False skips loading the local llama.cpp model, for callers
+        that only ingest books and never ask questions (batch runs).
+        vector_dtype applies to the memmap backend only.
+        """
         print(f"🧠 Initializing AI Assistant with provider: {provider.upper()}")
         self.provider = provider
+        self.vector_backend = vector_backend
+        self.vector_dtype = vector_dtype
+        self.retrieval_mode = retrieval_mode
+        self.llm = None
         
         if self.provider == "local":
-            self._initialize_local_models()
+            self._initialize_local_models(local_model_options or {}, load_llm)
         elif self.provider == "openai":
             if not api_key: raise ValueError("OpenAI API key is required.")
             self._initialize_openai_models(api_key)
         elif self.provider == "perplexity":
             if not api_key: raise ValueError("Perplexity API key is required.")
             self._initialize_perplexity_models(api_key)
+        elif self.provider == "fake":
+            self._initialize_fake_models()
         else:
             raise ValueError(f"Unsupported AI provider: {self.provider}")
-        self.chain = None
+        # Shared by the retriever and the semantic cache, so each question is embedded once.
+        self.embeddings = CachedEmbeddings(self.embeddings)
+        self.retriever = None
+        self.prompt = None
+        self.vector_store = None
+        self.lexical_index = None
+        self.active_book_ids = []
 
-    def _initialize_local_models(self):
-        from langchain_community.llms import LlamaCpp
+    def _initialize_local_models(self, options, load_llm=True):
         from langchain_huggingface import HuggingFaceEmbeddings
-        # ... (rest of local init is the same)
+        if load_llm:
+            from modules.local_llm import get_shared_llama, SharedLlamaCpp
+            # The model is loaded once per process and shared by every assistant.
+            shared_model = get_shared_llama(**options)
+            self.llm = SharedLlamaCpp(model=shared_model, max_tokens=512, temperature=0.2)
+        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2", model_kwargs={'device': 'cpu'})
         print("✅ Local models loaded successfully.")
 
     def _initialize_openai_models(self, api_key):
@@ -62,23 +91,99 @@ class AIAssistant:
             
         print("✅ Perplexity models initialized successfully.")
 
-    def ingest_document(self, structured_content, book_id):
-        db_path = os.path.join("./chroma_cache", book_id)
-        if os.path.exists(db_path):
-            print(f"🧠 Loading cached knowledge base for '{book_id}'...")
-            db = Chroma(persist_directory=db_path, embedding_function=self.embeddings)
+    def _initialize_fake_models(self):
+        """Deterministic offline models for local testing, no downloads or keys needed."""
+        from modules.fake_providers import FakeLLM, FakeEmbeddings
+        self.llm = FakeLLM()
+        self.embeddings = FakeEmbeddings()
+        print("✅ Fake models initialized (testing only).")
+
+    def _get_vector_store(self):
+        # The library index is opened once and shared by every book.
+        if self.vector_store is None:
+            self.vector_store = create_vector_store(self.vector_backend, self.embeddings, dtype=self.vector_dtype)
+            # The BM25 files live next to the vector store and are loaded per book on first use.
+            self.lexical_index = LexicalLibraryIndex(self.vector_store.persist_directory + "_lexical")
+        return self.vector_store
+
+    @instrumentation.timed("chunking")
+    def _split_into_chunks(self, structured_content):
+        # Running headers and page numbers would only add near-duplicate chunks.
+        text_based_content = [block['content'] for block in without_boilerplate(structured_content)
+                              if 'content' in block]
+        full_text = "\n\n".join(text_based_content)
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+        return text_splitter.split_text(full_text)
+
+    @staticmethod
+    def _report_boilerplate(structured_content):
+        skipped = [block for block in structured_content if is_boilerplate(block) and 'content' in block]
+        if not skipped:
+            return
+        # Exact chunk savings would need a second split of the whole book; characters are free to count.
+        removed_chars = sum(len(block['content']) for block in skipped)
+        print(f"🧹 Skipped {len(skipped)} header/footer blocks ({removed_chars} characters) before chunking.")
+        instrumentation.count("boilerplate_chars_skipped", removed_chars)
+
+    @profiling.profiled("ingest", book=lambda args: args["book_id"])
+    def ingest_document(self, structured_content, book_id, progress_callback=None):
+        """
+        Adds a book to the library index (if needed) and makes it the active book.
+        Returns True when the book's chunks were (re)built, so callers can drop
+        answers cached against an older version of the index.
+        progress_callback(stage, fraction) is called between batches, if given.
+        """
+        store = self._get_vector_store()
+        texts = None
+        if store.has_book(book_id):
+            print(f"🧠 '{book_id}' is already in the library index.")
         else:
-            print(f"📚 Creating new knowledge base for '{book_id}'...")
-            text_based_content = [block['content'] for block in structured_content if 'content' in block]
-            full_text = "\n\n".join(text_based_content)
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-            texts = text_splitter.split_text(full_text)
+            print(f"📚 Adding '{book_id}' to the library index...")
+            texts = self._split_into_chunks(structured_content)
+            self._report_boilerplate(structured_content)
             print(f"📄 Document split into {len(texts)} text chunks. Now embedding...")
-            db = Chroma.from_texts(texts=texts, embedding=self.embeddings, persist_directory=db_path)
-        
+            try:
+                with instrumentation.span("index_vectors", backend=self.vector_backend):
+                    store.add_book(book_id, texts, progress_callback)
+            except BaseException:
+                # A cancelled or failed ingest must not leave a partial book that
+                # has_book() would later report as complete.
+                store.delete_book(book_id)
+                raise
+
+        if texts is not None or not self.lexical_index.has_book(book_id):
+            # The splitter is deterministic, so rows line up with the vector store's chunks.
+            if texts is None:
+                texts = self._split_into_chunks(structured_content)
+            if progress_callback:
+                progress_callback("lexical index", None)
+            with instrumentation.span("index_lexical"):
+                self.lexical_index.add_book(book_id, texts)
+
         print("✅ Knowledge base is ready.")
-        retriever = db.as_retriever(search_kwargs={"k": 4})
+        self.set_active_books([book_id])
+        return texts is not None
+
+    def set_active_books(self, book_ids):
+        """
+        Scopes questions to one or more books that are already in the index.
+        Switching is just a new filter, nothing has to be reopened.
+        """
+        if not book_ids:
+            raise ValueError("At least one book ID is required.")
+        self.active_book_ids = list(book_ids)
+        self.retriever = self._make_retriever(self.active_book_ids)
+        self._init_prompt()
+
+    def _make_retriever(self, book_ids):
+        return HybridRetriever(
+            vector_store=self._get_vector_store(), lexical_index=self.lexical_index,
+            book_ids=list(book_ids), k=4, mode=self.retrieval_mode
+        )
 
+    def _init_prompt(self):
+        if self.prompt is not None:
+            return
         prompt_template = """
         Use the following pieces of context to answer the question at the end. If you don't know the answer from the context, just say that you don't know.
         Context: {context}
@@ -88,21 +193,161 @@ class AIAssistant:
         if self.provider == "local":
             prompt_template = "[INST]" + prompt_template + "[/INST]"
 
-        PROMPT = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-        
-        self.chain = RetrievalQA.from_chain_type(
-            llm=self.llm, chain_type="stuff", retriever=retriever,
-            chain_type_kwargs={"prompt": PROMPT}
-        )
+        self.prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
+        if self.provider == "local" and self.llm is not None:
+            # Everything before {context} is identical for every question, keep it in the KV cache.
+            self.llm.model.prime_prefix(prompt_template.split("{context}")[0])
+
+    def has_book(self, book_id):
+        """True when the book is fully ingested into the library index."""
+        return self._get_vector_store().has_book(book_id)
+
+    def delete_book(self, book_id):
+        """Drops a book from the library index without rebuilding anything else."""
+        removed = self._get_vector_store().delete_book(book_id)
+        self.lexical_index.delete_book(book_id)
+        if book_id in self.active_book_ids:
+            self.active_book_ids = [b for b in self.active_book_ids if b != book_id]
+            if self.active_book_ids:
+                self.set_active_books(self.active_book_ids)
+            else:
+                self.retriever = None
+        print(f"🗑️ Removed {removed} chunks for '{book_id}' from the library index.")
+        return removed
+
+    # --- Answering ---
+    # ask() and ask_many() share the same retrieval, prompt and LLM steps, so a
+    # batch run gives the same answers as asking the questions one by one.
+
+    MAX_LLM_ATTEMPTS = 4
+    RETRY_BASE_DELAY = 1.0
+
+    def _build_prompt(self, question, documents):
+        # Same layout as LangChain's "stuff" chain: chunks joined by blank lines.
+        context = "\n\n".join(document.page_content for document in documents)
+        return self.prompt.format(context=context, question=question)
+
+    @staticmethod
+    def _to_text(response):
+        # Chat models return a message, plain LLMs return a string.
+        return getattr(response, 'content', response)
+
+    def _retry_delay(self, attempt):
+        return self.RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random())
+
+    def _invoke_llm(self, prompt):
+        # Only API providers get retries; a local model failing is not transient.
+        attempts = 1 if self.provider == "local" else self.MAX_LLM_ATTEMPTS
+        for attempt in range(attempts):
+            try:
+                with instrumentation.span("llm", provider=self.provider):
+                    return self._to_text(self.llm.invoke(prompt))
+            except Exception:
+                if attempt == attempts - 1:
+                    raise
+                time.sleep(self._retry_delay(attempt))
+
+    async def _ainvoke_llm(self, prompt):
+        attempts = 1 if self.provider == "local" else self.MAX_LLM_ATTEMPTS
+        for attempt in range(attempts):
+            try:
+                with instrumentation.span("llm", provider=self.provider):
+                    return self._to_text(await self.llm.ainvoke(prompt))
+            except Exception:
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(self._retry_delay(attempt))
+
+    def _answer(self, question, documents):
+        try:
+            return self._invoke_llm(self._build_prompt(question, documents))
+        except Exception as e:
+            return f"An error occurred: {e}"
+
+    async def _aanswer(self, question, documents):
+        try:
+            return await self._ainvoke_llm(self._build_prompt(question, documents))
+        except Exception as e:
+            return f"An error occurred: {e}"
+
+    def _max_workers(self, max_concurrency):
+        # One llama.cpp model can only run one generation at a time.
+        return 1 if self.provider == "local" else max(1, max_concurrency)
 
     def ask(self, question):
-        if not self.chain:
+        if not self.retriever:
             return "Error: No document has been loaded. Please process a book first."
         try:
             print("⏳ Thinking...")
-            # LangChain v0.1 uses .invoke(), older versions might use .run() or .__call__()
-            response = self.chain.invoke(question)
-            # The key for the answer can be 'result' or 'answer' depending on the chain type
-            return response.get('result', response.get('answer', "Sorry, I couldn't find an answer."))
+            documents = self.retriever.retrieve_many([question])[0]
+        except Exception as e:
+            return f"An error occurred: {e}"
+        return self._answer(question, documents)
+
+    def ask_many(self, questions, max_concurrency=4):
+        """
+        Answers a batch of questions about the active books. All questions are
+        embedded in one call and retrieved together, then the LLM calls run
+        with at most max_concurrency in flight. Yields (index, question, answer)
+        tuples in the order they finish.
+        """
+        questions = list(questions)
+        if not self.retriever:
+            for index, question in enumerate(questions):
+                yield index, question, "Error: No document has been loaded. Please process a book first."
+            return
+        print(f"⏳ Answering {len(questions)} questions...")
+        all_documents = self.retriever.retrieve_many(questions)
+        with ThreadPoolExecutor(max_workers=self._max_workers(max_concurrency)) as executor:
+            futures = {
+                executor.submit(self._answer, question, documents): index
+                for index, (question, documents) in enumerate(zip(questions, all_documents))
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                yield index, questions[index], future.result()
+
+    def ask_stream(self, question, book_ids=None):
+        """
+        Yields the answer in pieces as the LLM produces them. With book_ids the
+        question is scoped to those books only, without changing the active
+        books, so concurrent callers can ask about different books.
+        """
+        if book_ids:
+            self._init_prompt()
+            retriever = self._make_retriever(book_ids)
+        else:
+            retriever = self.retriever
+        if not retriever:
+            yield "Error: No document has been loaded. Please process a book first."
+            return
+        try:
+            documents = retriever.retrieve_many([question])[0]
+            with instrumentation.span("llm", provider=self.provider, mode="stream"):
+                for chunk in self.llm.stream(self._build_prompt(question, documents)):
+                    yield self._to_text(chunk)
         except Exception as e:
-            return f"An error occurred: {e}"
\ No newline at end of file
+            # Streaming can't be retried once text has been sent, report it inline like ask().
+            yield f"An error occurred: {e}"
+
+    async def aask_many(self, questions, max_concurrency=4):
+        """Async version of ask_many, an async generator of (index, question, answer)."""
+        questions = list(questions)
+        if not self.retriever:
+            for index, question in enumerate(questions):
+                yield index, question, "Error: No document has been loaded. Please process a book first."
+            return
+        all_documents = await asyncio.to_thread(self.retriever.retrieve_many, questions)
+        semaphore = asyncio.Semaphore(self._max_workers(max_concurrency))
+
+        async def answer(index, question, documents):
+            async with semaphore:
+                return index, question, await self._aanswer(question, documents)
+
+        tasks = [asyncio.ensure_future(answer(i, q, d)) for i, (q, d) in enumerate(zip(questions, all_documents))]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
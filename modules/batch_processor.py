@@ -0,0 +1,349 @@
+# BookAlchemist/modules/batch_processor.py
+
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from modules import instrumentation, profiling
+from modules.boilerplate import count_boilerplate
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.epub', '.mobi')
+STAGES = ("parse", "render", "ingest")
+OUTPUT_FORMATS = ("pdf", "epub")
+MANIFEST_NAME = "batch_manifest.json"
+METRICS_NAME = "metrics.prom"
+CONTENT_NAME = "content.json"
+
+
+def book_id_for(path):
+    """Same naming rule as the GUI, so books processed in batch are found by the app."""
+    return profiling.book_name_from_path(path)
+
+
+def discover_books(inputs):
+    """
+    Expands directories (recursively), manifest files and single book paths
+    into an ordered list of book files. A manifest is either a .txt file with
+    one path per line ('#' starts a comment) or a .json list of paths; its
+    relative paths are resolved against the manifest's own folder.
+    """
+    books = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            for root, dirs, files in os.walk(entry):
+                dirs.sort()
+                books.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.lower().endswith(SUPPORTED_EXTENSIONS))
+        elif entry.lower().endswith(('.txt', '.json')):
+            base_dir = os.path.dirname(os.path.abspath(entry))
+            with open(entry, 'r', encoding='utf-8') as f:
+                if entry.lower().endswith('.json'):
+                    paths = json.load(f)
+                else:
+                    paths = [line.split('#', 1)[0].strip() for line in f]
+            books.extend(os.path.join(base_dir, path) for path in paths if path)
+        elif entry.lower().endswith(SUPPORTED_EXTENSIONS):
+            books.append(entry)
+        else:
+            print(f"⚠️ Skipping unsupported input: {entry}")
+    return list(dict.fromkeys(os.path.abspath(path) for path in books))
+
+
+def process_pool(workers):
+    """
+    A process pool whose workers are spawned, not forked. Forking a parent
+    that already runs model or event-loop threads can leave a lock held in
+    the child and hang it; spawn is also what Windows does anyway.
+    """
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# --- Stage workers ---
+# These run in child processes, so they are plain module-level functions that
+# only exchange file paths and small dicts with the parent. With metrics on,
+# the dict also carries the worker's spans under "metrics" for the parent to merge.
+
+def parse_book(source_path, book_dir):
+    """Parses one book and writes its structured content (and images) to book_dir."""
+    from modules.pdf_parser import PDFParser
+    from modules.epub_parser import EpubParser
+    from modules.mobi_converter import convert_mobi_to_epub
+
+    start = time.perf_counter()
+    os.makedirs(book_dir, exist_ok=True)
+    dominant_font = None
+    path_to_parse = source_path
+    if path_to_parse.lower().endswith('.mobi'):
+        path_to_parse = convert_mobi_to_epub(path_to_parse)
+        if not path_to_parse:
+            raise RuntimeError("MOBI to EPUB conversion failed. Please check Calibre.")
+    if path_to_parse.lower().endswith('.pdf'):
+        parser = PDFParser(file_path=path_to_parse, image_output_dir=os.path.join(book_dir, "images"))
+    else:
+        parser = EpubParser(file_path=path_to_parse)
+    try:
+        with profiling.book_context(os.path.basename(book_dir)):
+            structured_content = parser.extract_structured_content()
+        if isinstance(parser, PDFParser):
+            dominant_font, _ = parser.find_dominant_font()
+    finally:
+        parser.close()
+    if not structured_content:
+        raise RuntimeError("No content was extracted from the document.")
+
+    content_path = os.path.join(book_dir, CONTENT_NAME)
+    _write_json_atomic(content_path, {"source": source_path, "dominant_font": dominant_font,
+                                      "structured_content": structured_content})
+    return {"seconds": round(time.perf_counter() - start, 3), "blocks": len(structured_content),
+            "boilerplate_blocks": count_boilerplate(structured_content),
+            "content_path": content_path, "dominant_font": dominant_font,
+            "metrics": instrumentation.collect_and_reset()}
+
+
+def load_content(content_path):
+    with open(content_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def render_book(content_path, theme, output_path, book_title, output_format="pdf"):
+    """Renders one parsed book to a styled PDF (or EPUB) with one theme."""
+    start = time.perf_counter()
+    content = load_content(content_path)
+    with profiling.book_context(book_title):
+        if output_format == "epub":
+            from modules.epub_generator import EpubGenerator
+            if not EpubGenerator.generate_epub(content["structured_content"], output_path, theme, book_title,
+                                               dominant_font=content["dominant_font"]):
+                raise RuntimeError(f"EPUB generation failed for theme '{theme}'.")
+            return {"seconds": round(time.perf_counter() - start, 3), "epub_path": output_path,
+                    "metrics": instrumentation.collect_and_reset()}
+
+        from modules.styling_engine import StylingEngine
+        from modules.pdf_generator import PDFGenerator
+        engine = StylingEngine(structured_content=content["structured_content"])
+        html = engine.generate_html(theme_name=theme, book_title=book_title, dominant_font=content["dominant_font"])
+        html_seconds = time.perf_counter() - start
+        if not asyncio.run(PDFGenerator.generate_pdf_from_html(html, output_path)):
+            raise RuntimeError(f"PDF generation failed for theme '{theme}'.")
+    return {"seconds": round(time.perf_counter() - start, 3), "html_seconds": round(html_seconds, 3),
+            "pdf_path": output_path, "metrics": instrumentation.collect_and_reset()}
+
+
+def default_assistant_factory(provider=None, load_llm=True):
+    """
+    Builds the assistant and semantic cache from config.json, like the GUI
+    does. provider overrides the configured one (e.g. "fake" for testing).
+    load_llm=False gives an assistant that can only ingest, see ingest_assistant_factory.
+    """
+    from modules.ai_assistant import AIAssistant
+    from modules.cache_manager import SemanticCache
+    from modules.config_manager import ConfigManager
+
+    config = ConfigManager()
+    provider = provider or config.get_provider()
+    assistant = AIAssistant(provider=provider, api_key=config.get_api_key(provider),
+                            vector_backend=config.get_vector_backend(), vector_dtype=config.get_vector_dtype(),
+                            retrieval_mode=config.get_retrieval_mode(),
+                            local_model_options=config.get_local_model_options(), load_llm=load_llm)
+    cache = SemanticCache(embedding_model=assistant.embeddings, **config.get_cache_options())
+    return assistant, cache
+
+
+def ingest_assistant_factory(provider=None):
+    """Batch ingestion only embeds chunks, so the local chat model is never loaded."""
+    return default_assistant_factory(provider, load_llm=False)
+
+
+class BatchManifest:
+    """
+    Per-book state and timings for a batch run, kept in one JSON file in the
+    output folder. It is rewritten atomically after every stage, so a run
+    that crashes or is interrupted picks up where it stopped.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.data = {"version": 1, "books": {}}
+        if os.path.exists(path):
+            try:
+                self.data = load_content(path)
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"⚠️ Could not read batch manifest ({e}); starting a fresh one.")
+
+    @property
+    def books(self):
+        return self.data["books"]
+
+    def register(self, book_id, source, force=False):
+        """Adds a book, clearing its stages if the source file changed (or force is set)."""
+        fingerprint = _fingerprint(source)
+        entry = self.books.get(book_id)
+        if entry is None or force or entry.get("source") != source or entry.get("fingerprint") != fingerprint:
+            previously_ingested = bool(entry) and entry["stages"].get("ingest", {}).get("status") == "done"
+            entry = {"source": source, "fingerprint": fingerprint, "stages": {}, "stale_index": previously_ingested}
+            self.books[book_id] = entry
+        return entry
+
+    def stage(self, book_id, stage, key=None):
+        stages = self.books[book_id]["stages"]
+        return stages.get(f"{stage}:{key}" if key else stage, {})
+
+    def is_done(self, book_id, stage, key=None, output=None):
+        record = self.stage(book_id, stage, key)
+        return record.get("status") == "done" and (output is None or os.path.exists(output))
+
+    def mark(self, book_id, stage, status, key=None, **info):
+        record = {"status": status, **info}
+        self.books[book_id]["stages"][f"{stage}:{key}" if key else stage] = record
+        self.save()
+
+    def save(self):
+        self.data["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        _write_json_atomic(self.path, self.data)
+
+
+class BatchProcessor:
+    """
+    Runs parse -> render -> ingest over a library of books.
+
+    Rendering writes a PDF (Chromium) and/or an EPUB per theme.
+    Parsing and rendering are CPU-bound and run in separate process pools
+    with their own worker limits. Ingestion runs on one thread in this
+    process: the embedding model is loaded once, and the vector store and
+    BM25 index are not safe to write from several processes at a time.
+    Stages that already finished for an unchanged source file are skipped.
+    """
+    def __init__(self, output_dir, themes=("premium_novel",), parse_workers=None, render_workers=1,
+                 render=True, ingest=True, force=False, assistant_factory=ingest_assistant_factory,
+                 formats=("pdf",)):
+        self.output_dir = output_dir
+        self.themes = list(themes)
+        self.formats = list(formats)
+        self.parse_workers = parse_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.render_workers = render_workers
+        self.render = render and bool(self.themes) and bool(self.formats)
+        self.ingest = ingest
+        self.force = force
+        self.assistant_factory = assistant_factory
+        self.assistant = None
+        self.semantic_cache = None
+        os.makedirs(output_dir, exist_ok=True)
+        self.manifest = BatchManifest(os.path.join(output_dir, MANIFEST_NAME))
+
+    def _book_dir(self, book_id):
+        return os.path.join(self.output_dir, book_id)
+
+    def _content_path(self, book_id):
+        return os.path.join(self._book_dir(book_id), CONTENT_NAME)
+
+    def _output_path(self, book_id, theme, output_format):
+        return os.path.join(self._book_dir(book_id), f"{book_id}_{theme}.{output_format}")
+
+    def run(self, sources):
+        """Processes every book and returns the manifest data."""
+        run_start = time.perf_counter()
+        book_ids = {}
+        for source in sources:
+            book_id = book_id_for(source)
+            if book_id in book_ids:
+                print(f"⚠️ Skipping {source}: book ID '{book_id}' is already used by {book_ids[book_id]}")
+                continue
+            book_ids[book_id] = source
+            self.manifest.register(book_id, source, force=self.force)
+        self.manifest.save()
+
+        pending = {}
+        with process_pool(self.parse_workers) as parse_pool, \
+                process_pool(self.render_workers) as render_pool, \
+                ThreadPoolExecutor(1) as ingest_pool:
+            pools = {"parse": parse_pool, "render": render_pool, "ingest": ingest_pool}
+
+            def submit(stage, book_id, key, func, *args):
+                self.manifest.mark(book_id, stage, "running", key=key)
+                pending[pools[stage].submit(func, *args)] = (stage, book_id, key)
+
+            def schedule_downstream(book_id):
+                content_path = self._content_path(book_id)
+                if self.render:
+                    for theme in self.themes:
+                        for output_format in self.formats:
+                            # PDF renders keep the plain theme key, so older manifests still resume.
+                            key = theme if output_format == "pdf" else f"{theme}:{output_format}"
+                            output_path = self._output_path(book_id, theme, output_format)
+                            if not self.manifest.is_done(book_id, "render", key, output_path):
+                                submit("render", book_id, key, render_book, content_path, theme, output_path,
+                                       book_id, output_format)
+                if self.ingest and not self.manifest.is_done(book_id, "ingest"):
+                    submit("ingest", book_id, None, self._ingest_book, book_id, content_path)
+
+            for book_id, source in book_ids.items():
+                if self.manifest.is_done(book_id, "parse", output=self._content_path(book_id)):
+                    schedule_downstream(book_id)
+                else:
+                    submit("parse", book_id, None, parse_book, source, self._book_dir(book_id))
+
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, book_id, key = pending.pop(future)
+                        label = f"{stage}:{key}" if key else stage
+                        try:
+                            info = future.result()
+                            instrumentation.merge(info.pop("metrics", None))
+                        except Exception as e:
+                            print(f"❌ [{book_id}] {label} failed: {e}")
+                            self.manifest.mark(book_id, stage, "failed", key=key, error=str(e))
+                            continue
+                        print(f"✅ [{book_id}] {label} done in {info['seconds']:.2f}s")
+                        self.manifest.mark(book_id, stage, "done", key=key, **info)
+                        if stage == "parse":
+                            schedule_downstream(book_id)
+            except KeyboardInterrupt:
+                print("⏹️ Interrupted, waiting for running stages to stop. Re-run to resume.")
+                for future in pending:
+                    future.cancel()
+                raise
+
+        self.manifest.data["last_run_seconds"] = round(time.perf_counter() - run_start, 3)
+        self.manifest.save()
+        if instrumentation.is_enabled():
+            instrumentation.write_prometheus(os.path.join(self.output_dir, METRICS_NAME))
+        return self.manifest.data
+
+    def _ingest_book(self, book_id, content_path):
+        start = time.perf_counter()
+        if self.assistant is None:
+            self.assistant, self.semantic_cache = self.assistant_factory()
+        entry = self.manifest.books[book_id]
+        if entry.get("stale_index"):
+            # The source changed since it was indexed; drop the old chunks so they get rebuilt.
+            self.assistant.delete_book(book_id)
+        content = load_content(content_path)
+        rebuilt = self.assistant.ingest_document(content["structured_content"], book_id)
+        if rebuilt and self.semantic_cache:
+            # Answers cached against an older index of this book may no longer hold.
+            self.semantic_cache.invalidate_book(book_id)
+        entry["stale_index"] = False
+        return {"seconds": round(time.perf_counter() - start, 3), "rebuilt": rebuilt}
+
+    def summary(self):
+        """Counts of stage records by status across every book in the manifest."""
+        counts = {}
+        for entry in self.manifest.books.values():
+            for record in entry["stages"].values():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return counts
@@ -0,0 +1,77 @@
+# BookAlchemist/modules/boilerplate.py
+#
+# Cross-page header/footer detection for parsed PDFs. Running heads, page
+# numbers and copyright footers come out of PyMuPDF as ordinary text blocks on
+# every page; left in, they end up in the styled book and in thousands of
+# near-identical chunks that are embedded, stored and sent to the model.
+#
+# The parser reports every text block that sits in the top or bottom band of
+# its page. Once all pages are seen, a block is tagged 'boilerplate': True when
+#   - it looks like a page number ("12", "- 12 -", "Page 12 of 300", "xii"), or
+#   - the same text sits in the same band on at least MIN_PAGES pages, or
+#   - the same text with digits ignored ("Page # of 300") sits in the same band
+#     on at least MIN_PAGE_FRACTION of all pages.
+# Tagged blocks stay in the structured content so nothing is lost, but the
+# styling engine and the chunker skip them.
+
+import re
+from collections import defaultdict
+
+HEADER_BAND = 0.08  # top 8% of the page height
+FOOTER_BAND = 0.08  # bottom 8%
+MIN_PAGES = 3
+MIN_PAGE_FRACTION = 0.25
+
+# Only well-formed roman numerals, and not a lone "i", so margin words like "did" or "mild" are kept.
+_ROMAN_NUMERAL = r"(?!i\b)m{0,3}(?:c[md]|d?c{0,3})(?:x[cl]|l?x{0,3})(?:i[xv]|v?i{0,3})(?<=[mdclxvi])"
+_PAGE_NUMBER = re.compile(r"^[\W_]*(page\s*)?(\d{1,4}|" + _ROMAN_NUMERAL + r")(\s*(of|/)\s*\d{1,4})?[\W_]*$",
+                          re.IGNORECASE)
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def is_boilerplate(block):
+    return block.get('boilerplate', False)
+
+
+def without_boilerplate(structured_content):
+    return [block for block in structured_content if not block.get('boilerplate')]
+
+
+def count_boilerplate(structured_content):
+    return sum(1 for block in structured_content if block.get('boilerplate'))
+
+
+class BoilerplateDetector:
+    """Collects margin blocks while a PDF is parsed, then tags the repeated ones in place."""
+    def __init__(self):
+        self.candidates = []  # (block, page_num, band, text)
+
+    def observe(self, block, page_num, bbox, page_height):
+        """Remembers `block` if its bbox lies entirely inside the header or footer band."""
+        if bbox[3] <= page_height * HEADER_BAND:
+            band = "header"
+        elif bbox[1] >= page_height * (1 - FOOTER_BAND):
+            band = "footer"
+        else:
+            return
+        text = _SPACES.sub(" ", block['content']).strip().lower()
+        self.candidates.append((block, page_num, band, text))
+
+    def tag(self, page_count):
+        """Marks the boilerplate blocks and returns how many there were."""
+        exact_pages = defaultdict(set)
+        pattern_pages = defaultdict(set)
+        for _, page_num, band, text in self.candidates:
+            exact_pages[(band, text)].add(page_num)
+            pattern_pages[(band, _DIGITS.sub("#", text))].add(page_num)
+
+        min_pattern_pages = max(MIN_PAGES, MIN_PAGE_FRACTION * page_count)
+        tagged = 0
+        for block, _, band, text in self.candidates:
+            if (_PAGE_NUMBER.match(text)
+                    or len(exact_pages[(band, text)]) >= MIN_PAGES
+                    or len(pattern_pages[(band, _DIGITS.sub("#", text))]) >= min_pattern_pages):
+                block['boilerplate'] = True
+                tagged += 1
+        return tagged
@@ -2,72 +2,452 @@
 
 import json
 import os
+import sqlite3
+import threading
+import time
+from collections import deque
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from modules import instrumentation
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class _IVFIndex:
+    """
+    A small inverted-file index (k-means buckets) for very large caches.
+    Only the buckets closest to the query are scanned, plus any rows added
+    after the index was built.
+    """
+    def __init__(self, matrix, size, n_probe=8, iterations=5, seed=0):
+        rng = np.random.default_rng(seed)
+        n_lists = max(1, int(np.sqrt(size)))
+        vectors = matrix[:size]
+        sample = vectors[rng.choice(size, min(size, n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = _normalize(members.mean(axis=0))
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(n_lists + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(n_lists)]
+        self.centroids = centroids
+        self.n_probe = min(n_probe, n_lists)
+        self.built_size = size
+
+    def candidates(self, query, size):
+        nearest = np.argpartition(-(self.centroids @ query), self.n_probe - 1)[:self.n_probe]
+        tail = np.arange(self.built_size, size)
+        rows = np.concatenate([self.lists[c] for c in nearest] + [tail])
+        # Evictions shrink the matrix, so rows past the end may no longer exist.
+        return rows[rows < size]
+
+
+class _CachedBook:
+    """
+    The cached questions of one book as a contiguous, pre-normalized float32
+    matrix. Capacity doubles when full, so appends are amortized O(1) and a
+    lookup is a single matrix-vector product. Creation times are kept per
+    row for TTLs.
+    """
+    def __init__(self, dim, capacity=64, approx_threshold=50000):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.created = np.zeros(capacity, dtype=np.float64)
+        self.size = 0
+        self.questions = []
+        self.answers = []
+        self.rows = {}
+        self.approx_threshold = approx_threshold
+        self.ivf = None
+        self.ivf_removals = 0
+
+    def _grow(self):
+        capacity = len(self.matrix) * 2
+        for name in ('matrix', 'created'):
+            old = getattr(self, name)
+            grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, name, grown)
+
+    def add(self, question, answer, vector, created_at):
+        """Adds or replaces a question. Returns True if it was not cached before."""
+        vector = _normalize(vector)
+        row = self.rows.get(question)
+        is_new = row is None
+        if is_new:
+            if self.size == len(self.matrix):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.questions.append(question)
+            self.answers.append(answer)
+            self.rows[question] = row
+        else:
+            self.answers[row] = answer
+        self.matrix[row] = vector
+        self.created[row] = created_at
+        return is_new
+
+    def remove(self, question):
+        """Removes a question by moving the last row into its place."""
+        row = self.rows.pop(question, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.created[row] = self.created[last]
+            self.questions[row] = self.questions[last]
+            self.answers[row] = self.answers[last]
+            self.rows[self.questions[row]] = row
+        self.questions.pop()
+        self.answers.pop()
+        self.size = last
+        self.ivf_removals += 1
+
+    def _refresh_index(self):
+        if self.size < self.approx_threshold:
+            self.ivf = None
+        elif (self.ivf is None or self.size >= 2 * self.ivf.built_size
+              or self.ivf_removals > self.ivf.built_size // 10):
+            self.ivf = _IVFIndex(self.matrix, self.size)
+            self.ivf_removals = 0
+
+    def most_similar(self, query):
+        """Returns (row, similarity) of the closest cached question."""
+        self._refresh_index()
+        if self.ivf is not None:
+            rows = self.ivf.candidates(query, self.size)
+            similarities = self.matrix[rows] @ query
+            best = int(np.argmax(similarities))
+            return int(rows[best]), float(similarities[best])
+        similarities = self.matrix[:self.size] @ query
+        best = int(np.argmax(similarities))
+        return best, float(similarities[best])
+
 
 class SemanticCache:
-    def __init__(self, embedding_model, cache_file='semantic_cache.json', similarity_threshold=0.95):
+    """
+    Remembers answers per book and returns them for semantically similar
+    questions. Entries are stored in SQLite (WAL mode), so adding an answer
+    is a single-row write and a crash can never corrupt earlier entries.
+    Vectors are stored as float16 blobs and a book's vectors are only read
+    the first time that book is looked up.
+
+    The cache can be bounded per book (max_entries_per_book) and overall
+    (max_entries), evicting by 'lru' or 'lfu', and entries older than
+    ttl_seconds are dropped. get_stats() reports hits, misses, lookup latency
+    and a histogram of best-match similarities for tuning the threshold.
+    """
+    EVICTION_POLICIES = ('lru', 'lfu')
+    EVICTION_ORDER = {'lru': "last_access", 'lfu': "hits, last_access"}
+    SIMILARITY_BINS = 20
+    # user_version 2: vectors are float16 blobs (earlier databases used float32).
+    SCHEMA_VERSION = 2
+    VECTOR_DTYPE = np.float16
+
+    def __init__(self, embedding_model, cache_file='semantic_cache.db', similarity_threshold=0.95,
+                 legacy_cache_file='semantic_cache.json', approx_threshold=50000,
+                 max_entries_per_book=None, max_entries=None, eviction_policy='lru', ttl_seconds=None):
+        if eviction_policy not in self.EVICTION_POLICIES:
+            raise ValueError(f"Unsupported eviction policy: {eviction_policy}")
         self.cache_file = cache_file
         self.embedding_model = embedding_model
         self.similarity_threshold = similarity_threshold
-        self.cache = self._load_cache()
+        # Books with at least this many cached questions use an approximate index.
+        self.approx_threshold = approx_threshold
+        self.max_entries_per_book = max_entries_per_book
+        self.max_entries = max_entries
+        self.eviction_policy = eviction_policy
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.RLock()
+        self._reset_stats()
+        self.conn = self._open_database()
+        self._import_legacy_cache(legacy_cache_file)
+        # Loaded books only; entry counts are known for every book.
+        self.cache = {}
+        self._counts = {}
+        self._load_cache()
+
+    def _connect(self):
+        # The GUI calls the cache from worker threads; self._lock serializes access.
+        conn = sqlite3.connect(self.cache_file, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    book_id TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL DEFAULT 0,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (book_id, question)
+                )
+            """)
+            # Databases created before eviction support lack the usage columns.
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(answers)")}
+            if 'last_access' not in columns:
+                conn.execute("ALTER TABLE answers ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+                conn.execute("ALTER TABLE answers ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+                conn.execute("UPDATE answers SET last_access = created_at")
+            # Eviction picks its victim straight from these indexes.
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_lru ON answers (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_lfu ON answers (hits, last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS answers_book_lru ON answers (book_id, last_access)")
+            if conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                self._convert_vectors_to_float16(conn)
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.commit()
+        except sqlite3.DatabaseError:
+            conn.close()
+            raise
+        return conn
+
+    def _convert_vectors_to_float16(self, conn):
+        rows = conn.execute("SELECT book_id, question, vector FROM answers").fetchall()
+        conn.executemany(
+            "UPDATE answers SET vector = ? WHERE book_id = ? AND question = ?",
+            [(self._encode(np.frombuffer(vector, dtype=np.float32)), book_id, question)
+             for book_id, question, vector in rows]
+        )
+
+    def _encode(self, vector):
+        return np.asarray(vector, dtype=self.VECTOR_DTYPE).tobytes()
+
+    def _decode(self, blob):
+        return np.frombuffer(blob, dtype=self.VECTOR_DTYPE).astype(np.float32)
+
+    def _open_database(self):
+        try:
+            return self._connect()
+        except sqlite3.DatabaseError as e:
+            # Never throw away a damaged file silently: keep it for inspection and start fresh.
+            corrupt_path = f"{self.cache_file}.corrupt-{int(time.time())}"
+            print(f"⚠️ Semantic cache database is unreadable ({e}). Moved it to {corrupt_path}.")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.cache_file + suffix):
+                    os.replace(self.cache_file + suffix, corrupt_path + suffix)
+            return self._connect()
+
+    def _import_legacy_cache(self, legacy_cache_file):
+        """One-time migration from the old semantic_cache.json file."""
+        if not legacy_cache_file or not os.path.exists(legacy_cache_file):
+            return
+        try:
+            with open(legacy_cache_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️ Could not read legacy semantic cache {legacy_cache_file}: {e}")
+            return
+
+        now = time.time()
+        rows = [
+            (book_id, question, item['answer'], self._encode(item['vector']), now, now)
+            for book_id, entries in legacy.items()
+            for question, item in entries.items()
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO answers (book_id, question, answer, vector, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        os.replace(legacy_cache_file, legacy_cache_file + ".migrated")
+        print(f"Imported {len(rows)} cached answers from {legacy_cache_file}.")
 
     def _load_cache(self):
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
-                return {}
-        return {}
+        """Drops expired entries and counts the rest; vectors are loaded per book later."""
+        if self.ttl_seconds:
+            with self.conn:
+                self.conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._counts = dict(self.conn.execute("SELECT book_id, COUNT(*) FROM answers GROUP BY book_id"))
+        # The limits may have been lowered since the cache was written.
+        with self.conn:
+            for book_id in list(self._counts):
+                self._enforce_limits(book_id)
 
-    def _save_cache(self):
+    def _get_book(self, book_id):
+        """Returns the in-memory matrix of a book, reading it from disk on first use."""
+        if book_id not in self.cache:
+            book = None
+            for question, answer, vector, created_at in self.conn.execute(
+                    "SELECT question, answer, vector, created_at FROM answers WHERE book_id = ? ORDER BY created_at",
+                    (book_id,)):
+                vector = self._decode(vector)
+                if book is None:
+                    book = _CachedBook(len(vector), approx_threshold=self.approx_threshold)
+                book.add(question, answer, vector, created_at)
+            if book is None:
+                return None
+            self.cache[book_id] = book
+        return self.cache[book_id]
+
+    def _delete_rows(self, keys):
+        if not keys:
+            return
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, indent=4, ensure_ascii=False)
-        except IOError as e:
+            with self.conn:
+                self.conn.executemany("DELETE FROM answers WHERE book_id = ? AND question = ?", keys)
+        except sqlite3.Error as e:
             print(f"Error saving semantic cache: {e}")
 
-    def get_similar_answer(self, book_id, question):
-        if book_id not in self.cache or not self.cache[book_id]:
+    def _evict_one(self, book_id=None, protect=(None, None)):
+        """Picks the next victim (within one book, or globally) and removes it from memory."""
+        order = self.EVICTION_ORDER[self.eviction_policy]
+        # Never evict the answer that is being added right now.
+        if book_id is None:
+            victim = self.conn.execute(
+                f"SELECT book_id, question FROM answers WHERE NOT (book_id IS ? AND question IS ?) "
+                f"ORDER BY {order} LIMIT 1", protect).fetchone()
+        else:
+            victim = self.conn.execute(
+                f"SELECT book_id, question FROM answers WHERE book_id = ? AND question IS NOT ? "
+                f"ORDER BY {order} LIMIT 1", (book_id, protect[1] if protect[0] == book_id else None)).fetchone()
+        if victim is None:
             return None
+        victim_book, question = victim
+        if victim_book in self.cache:
+            self.cache[victim_book].remove(question)
+        # Runs inside the caller's transaction, together with the insert that caused it.
+        self.conn.execute("DELETE FROM answers WHERE book_id = ? AND question = ?", victim)
+        self._counts[victim_book] -= 1
+        self._stats['evictions'] += 1
+        return victim_book, question
+
+    def _enforce_limits(self, book_id, protect=(None, None)):
+        """Evicts entries until the per-book and global caps hold. Returns the removed keys."""
+        evicted = []
+        while self.max_entries_per_book and self._counts.get(book_id, 0) > self.max_entries_per_book:
+            key = self._evict_one(book_id, protect)
+            if key is None:
+                break
+            evicted.append(key)
+        while self.max_entries and sum(self._counts.values()) > self.max_entries:
+            key = self._evict_one(None, protect)
+            if key is None:
+                break
+            evicted.append(key)
+        return evicted
+
+    def _reset_stats(self):
+        self._stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+        self._latencies = deque(maxlen=1000)
+        self._similarities = np.zeros(self.SIMILARITY_BINS, dtype=np.int64)
+
+    def _record_lookup(self, started, hit, similarity=None):
+        self._stats['lookups'] += 1
+        self._stats['hits' if hit else 'misses'] += 1
+        self._latencies.append(time.perf_counter() - started)
+        instrumentation.observe("semantic_cache_lookup", self._latencies[-1])
+        instrumentation.count("semantic_cache_lookups", result="hit" if hit else "miss")
+        if similarity is not None:
+            bin_index = int(np.clip(similarity, 0, 0.9999) * self.SIMILARITY_BINS)
+            self._similarities[bin_index] += 1
+
+    def get_similar_answer(self, book_id, question):
+        started = time.perf_counter()
+        with self._lock:
+            if not self._counts.get(book_id):
+                self._record_lookup(started, hit=False)
+                return None
 
-        # --- THE REAL FIX IS HERE ---
-        # 1. Get the vector as a list from the embedding model.
-        new_question_vector_list = self.embedding_model.embed_query(question)
-        # 2. Convert this list into a numpy array.
-        new_question_vector_np = np.array(new_question_vector_list)
-        
-        cached_questions = list(self.cache[book_id].keys())
-        cached_vectors = np.array([item['vector'] for item in self.cache[book_id].values()])
-
-        # 3. Now that it's a numpy array, we can safely reshape it.
-        similarities = cosine_similarity(
-            new_question_vector_np.reshape(1, -1),
-            cached_vectors
-        )[0]
-
-        if np.max(similarities) >= self.similarity_threshold:
-            most_similar_index = np.argmax(similarities)
-            most_similar_question = cached_questions[most_similar_index]
-            
-            print(f"--- Semantic Cache Hit! (Similarity: {np.max(similarities):.2f}) ---")
-            print(f"    New Question: '{question}'")
-            print(f"    Matched with: '{most_similar_question}'")
-            
-            return self.cache[book_id][most_similar_question]['answer']
-        
-        return None
+        query = _normalize(self.embedding_model.embed_query(question))
+        with self._lock:
+            book = self._get_book(book_id)
+            if book is None or not book.size:
+                self._record_lookup(started, hit=False)
+                return None
+            row, similarity = book.most_similar(query)
+            now = time.time()
+
+            if similarity >= self.similarity_threshold and self.ttl_seconds and now - book.created[row] > self.ttl_seconds:
+                matched = book.questions[row]
+                book.remove(matched)
+                self._counts[book_id] -= 1
+                self._delete_rows([(book_id, matched)])
+                self._stats['expired'] += 1
+                self._record_lookup(started, hit=False, similarity=similarity)
+                return None
+
+            if similarity >= self.similarity_threshold:
+                matched = book.questions[row]
+                answer = book.answers[row]
+                try:
+                    with self.conn:
+                        self.conn.execute(
+                            "UPDATE answers SET last_access = ?, hits = hits + 1 WHERE book_id = ? AND question = ?",
+                            (now, book_id, matched))
+                except sqlite3.Error as e:
+                    print(f"Error saving semantic cache: {e}")
+                self._record_lookup(started, hit=True, similarity=similarity)
+
+                print(f"--- Semantic Cache Hit! (Similarity: {similarity:.2f}) ---")
+                print(f"    New Question: '{question}'")
+                print(f"    Matched with: '{matched}'")
+                return answer
+
+            self._record_lookup(started, hit=False, similarity=similarity)
+            return None
 
     def add_answer(self, book_id, question, answer):
-        if book_id not in self.cache:
-            self.cache[book_id] = {}
-
-        question_vector = self.embedding_model.embed_query(question)
-        
-        # This part was already correct. The vector is a list, which is what JSON needs.
-        self.cache[book_id][question] = {
-            'answer': answer,
-            'vector': question_vector 
-        }
-        self._save_cache()
\ No newline at end of file
+        question_vector = np.asarray(self.embedding_model.embed_query(question), dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            book = self._get_book(book_id)
+            if book is None:
+                book = self.cache[book_id] = _CachedBook(len(question_vector), approx_threshold=self.approx_threshold)
+            is_new = book.add(question, answer, question_vector, now)
+
+            # One row per answer instead of rewriting the whole cache.
+            try:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO answers (book_id, question, answer, vector, created_at, last_access, hits) "
+                        "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                        (book_id, question, answer, self._encode(question_vector), now, now)
+                    )
+                    if is_new:
+                        self._counts[book_id] = self._counts.get(book_id, 0) + 1
+                        self._enforce_limits(book_id, protect=(book_id, question))
+            except sqlite3.Error as e:
+                print(f"Error saving semantic cache: {e}")
+
+    def invalidate_book(self, book_id):
+        """Forgets every cached answer for a book, e.g. after it was re-ingested."""
+        with self._lock:
+            self.cache.pop(book_id, None)
+            removed = self._counts.pop(book_id, 0)
+            try:
+                with self.conn:
+                    self.conn.execute("DELETE FROM answers WHERE book_id = ?", (book_id,))
+            except sqlite3.Error as e:
+                print(f"Error saving semantic cache: {e}")
+            self._stats['invalidations'] += removed
+        return removed
+
+    def get_stats(self):
+        """Counters since start-up, plus latency and similarity data for threshold tuning."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['hit_rate'] = stats['hits'] / stats['lookups'] if stats['lookups'] else 0.0
+            latencies_ms = np.array(self._latencies) * 1000
+            stats['lookup_ms_p50'] = float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else 0.0
+            stats['lookup_ms_p95'] = float(np.percentile(latencies_ms, 95)) if len(latencies_ms) else 0.0
+            stats['entries'] = sum(self._counts.values())
+            stats['entries_per_book'] = {book_id: count for book_id, count in self._counts.items() if count}
+            stats['loaded_books'] = sorted(self.cache)
+            stats['similarity_threshold'] = self.similarity_threshold
+            # Count of lookups whose best match fell in each [x, x + 0.05) similarity bin.
+            width = 1.0 / self.SIMILARITY_BINS
+            stats['best_similarity_histogram'] = {
+                f"{i * width:.2f}": int(count) for i, count in enumerate(self._similarities) if count
+            }
+            return stats
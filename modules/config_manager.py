@@ -11,7 +11,23 @@ class ConfigManager:
         return {
             "provider": "local",
             "openai_api_key": "",
-            "perplexity_api_key": ""
+            "perplexity_api_key": "",
+            "vector_backend": "chroma",
+            # Memmap backend only: "float16", or "int8" for a quarter of the float32 size.
+            "vector_dtype": "float16",
+            "retrieval_mode": "hybrid",
+            # Local llama.cpp tuning; 0 threads means "pick from the CPU count".
+            "local_model_path": os.path.join("models", "mistral-7b-instruct-v0.2.q4_k_m.gguf"),
+            "local_threads": 0,
+            "local_batch_size": 512,
+            "local_context_size": 4096,
+            "local_gpu_layers": -1,
+            # Semantic cache limits; 0 means unlimited.
+            "cache_max_entries_per_book": 2000,
+            "cache_max_entries": 20000,
+            "cache_eviction_policy": "lru",
+            "cache_ttl_days": 0,
+            "cache_similarity_threshold": 0.95
         }
 
     def _load_config(self):
@@ -34,12 +50,15 @@ class ConfigManager:
             pass
         return default_config
 
-    def save_config(self, provider, openai_key, perplexity_key):
-        self.config = {
+    def save_config(self, provider, openai_key, perplexity_key, vector_backend=None):
+        # Update in place so settings this window doesn't know about are kept.
+        self.config.update({
             "provider": provider,
             "openai_api_key": base64.b64encode(openai_key.encode('utf-8')).decode('utf-8'),
             "perplexity_api_key": base64.b64encode(perplexity_key.encode('utf-8')).decode('utf-8')
-        }
+        })
+        if vector_backend:
+            self.config["vector_backend"] = vector_backend
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(self.config, f, indent=4)
@@ -49,6 +68,38 @@ class ConfigManager:
     def get_provider(self):
         return self.config.get("provider", "local")
 
+    def get_vector_backend(self):
+        return self.config.get("vector_backend", "chroma")
+
+    def get_vector_dtype(self):
+        return self.config.get("vector_dtype", "float16")
+
+    def get_retrieval_mode(self):
+        return self.config.get("retrieval_mode", "hybrid")
+
+    def get_local_model_options(self):
+        """Keyword arguments for modules.local_llm.get_shared_llama."""
+        defaults = self._get_default_config()
+        return {
+            "model_path": self.config.get("local_model_path", defaults["local_model_path"]),
+            "n_threads": self.config.get("local_threads", 0) or None,
+            "n_batch": self.config.get("local_batch_size", defaults["local_batch_size"]),
+            "n_ctx": self.config.get("local_context_size", defaults["local_context_size"]),
+            "n_gpu_layers": self.config.get("local_gpu_layers", defaults["local_gpu_layers"])
+        }
+
+    def get_cache_options(self):
+        """Keyword arguments for SemanticCache."""
+        defaults = self._get_default_config()
+        get = lambda key: self.config.get(key, defaults[key])
+        return {
+            "similarity_threshold": get("cache_similarity_threshold"),
+            "max_entries_per_book": get("cache_max_entries_per_book") or None,
+            "max_entries": get("cache_max_entries") or None,
+            "eviction_policy": get("cache_eviction_policy"),
+            "ttl_seconds": get("cache_ttl_days") * 86400 or None
+        }
+
     def get_api_key(self, provider_name):
         """Gets the key for a specific provider ('openai' or 'perplexity')."""
         key_name = f"{provider_name}_api_key"
@@ -0,0 +1,120 @@
+# BookAlchemist/modules/embedding_cache.py
+
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_core.embeddings import Embeddings
+from modules import instrumentation
+
+
+def normalize_text(text):
+    """Memo key for a question: Unicode-normalized with whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Front-end for an embedding model that is shared by the semantic cache and
+    the retriever, so one question is embedded once instead of up to three
+    times. Query vectors are memoized in an LRU keyed by normalized text, and
+    queries arriving from several threads at the same moment are embedded
+    together by one leader thread, in a single call to the model.
+
+    embed_documents() (used when ingesting a book) goes straight to the
+    wrapped model, so thousands of chunks never push questions out of the memo.
+    """
+    def __init__(self, base, max_entries=4096, batch_window=0.002, max_batch_size=64):
+        self.base = base
+        self.max_entries = max_entries
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._memo = OrderedDict()
+        self._in_flight = {}
+        self._queue = []
+        self._flushing = False
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'batches': 0}
+
+    def embed_documents(self, texts):
+        instrumentation.count("chunks_embedded", len(texts))
+        with instrumentation.span("embedding", kind="document"):
+            return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts):
+        """Embeds questions, reusing memoized vectors and batching the rest."""
+        instrumentation.count("query_embeddings", len(texts))
+        keys = [normalize_text(text) for text in texts]
+        waiting = {}
+        results = {}
+        new_keys = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._memo:
+                    self._memo.move_to_end(key)
+                    results[key] = self._memo[key]
+                    self.stats['hits'] += 1
+                elif key in self._in_flight:
+                    # Another thread is already embedding this exact question.
+                    waiting[key] = self._in_flight[key]
+                    self.stats['hits'] += 1
+                else:
+                    waiting[key] = self._in_flight[key] = Future()
+                    new_keys.append(key)
+                    self.stats['misses'] += 1
+            self._queue.extend(new_keys)
+            lead = bool(new_keys) and not self._flushing
+            if lead:
+                self._flushing = True
+
+        if lead:
+            if len(self._queue) < self.max_batch_size:
+                # Give concurrent callers a moment to join this batch.
+                time.sleep(self.batch_window)
+            self._flush()
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+        return [results[key] for key in keys]
+
+    def _flush(self):
+        while True:
+            with self._lock:
+                batch = self._queue[:self.max_batch_size]
+                del self._queue[:len(batch)]
+                if not batch:
+                    self._flushing = False
+                    return
+                futures = [self._in_flight[key] for key in batch]
+                self.stats['batches'] += 1
+            try:
+                with instrumentation.span("embedding", kind="query"):
+                    vectors = self._embed_batch(batch)
+            except Exception as e:
+                with self._lock:
+                    for key in batch:
+                        self._in_flight.pop(key, None)
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                for key, vector in zip(batch, vectors):
+                    self._memo[key] = vector
+                    self._in_flight.pop(key, None)
+                while len(self._memo) > self.max_entries:
+                    self._memo.popitem(last=False)
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+
+    def _embed_batch(self, batch):
+        """One model call per batch; stats['batches'] counts these calls."""
+        if len(batch) == 1:
+            return [self.base.embed_query(batch[0])]
+        embed_queries = getattr(self.base, "embed_queries", None)
+        if embed_queries is not None:
+            return embed_queries(batch)
+        return self.base.embed_documents(batch)
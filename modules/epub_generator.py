@@ -0,0 +1,160 @@
+# BookAlchemist/modules/epub_generator.py
+#
+# Reflowable EPUB 3 output. The structured blocks are rendered with the same
+# StylingEngine markup and theme CSS as the PDF, split into one XHTML file per
+# chapter, and streamed straight into the zip together with the extracted
+# images. No browser is involved, so even very large books take seconds.
+
+import html
+import os
+import re
+import time
+import uuid
+import zipfile
+from modules.boilerplate import without_boilerplate
+from modules.styling_engine import StylingEngine
+from modules import instrumentation, profiling
+
+# E-readers slow down on very long XHTML files, so long chapters are split.
+MAX_BLOCKS_PER_FILE = 400
+
+MEDIA_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".gif": "image/gif",
+               ".svg": "image/svg+xml", ".webp": "image/webp"}
+
+CONTAINER_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>"""
+
+
+def _xhtml(title, body, stylesheet="../style.css"):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">
+  <head>
+    <meta charset="UTF-8" />
+    <title>{html.escape(title)}</title>
+    <link rel="stylesheet" type="text/css" href="{stylesheet}" />
+  </head>
+  <body>
+{body}
+  </body>
+</html>"""
+
+
+def split_chapters(structured_content):
+    """
+    Groups blocks into (title, blocks) sections, starting a new one at every
+    chapter_title. Content without chapter titles (PDFs) is split on headings.
+    """
+    blocks = without_boilerplate(structured_content)
+    split_type = 'chapter_title' if any(block['type'] == 'chapter_title' for block in blocks) else 'heading'
+    sections = []
+    title, current = None, []
+    for block in blocks:
+        # A caption always stays in the same file as the image before it.
+        if (block['type'] == split_type and current) or (len(current) >= MAX_BLOCKS_PER_FILE
+                                                          and block['type'] != 'image_caption'):
+            sections.append((title, current))
+            title, current = None, []
+        if block['type'] == split_type and title is None and not current:
+            title = block['content']
+        current.append(block)
+    if current:
+        sections.append((title, current))
+    return sections
+
+
+class EpubGenerator:
+    @staticmethod
+    @profiling.profiled("render", book=lambda args: profiling.book_name_from_path(args["output_path"]))
+    @instrumentation.timed("render", format="epub")
+    def generate_epub(structured_content, output_path, theme_name, book_title, dominant_font=None):
+        """
+        Writes the structured content as an EPUB at output_path.
+        Returns True on success, like PDFGenerator.generate_pdf_from_html.
+        """
+        tmp_path = f"{output_path}.tmp"
+        try:
+            EpubGenerator._write(structured_content, tmp_path, theme_name, book_title, dominant_font)
+            os.replace(tmp_path, output_path)
+            return True
+        except Exception as e:
+            print(f"❌ Error during EPUB generation: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    @staticmethod
+    def _write(structured_content, path, theme_name, book_title, dominant_font):
+        engine = StylingEngine(structured_content)
+        # Remote @imports are not allowed in an EPUB; readers fall back to the next font in the stack.
+        css = re.sub(r"@import[^;]*;", "", engine.get_theme_css(theme_name, dominant_font))
+        images = {}  # source path -> name inside the EPUB
+        chapters = []  # (file name, title)
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            # The mimetype entry must come first and be stored uncompressed.
+            zf.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+            zf.writestr("META-INF/container.xml", CONTAINER_XML)
+            zf.writestr("OEBPS/style.css", css)
+
+            for index, (title, blocks) in enumerate(split_chapters(structured_content), start=1):
+                new_images = []
+
+                def image_src(block):
+                    source = StylingEngine.image_file_path(block)
+                    if source not in images:
+                        if not os.path.exists(source):
+                            return None
+                        extension = os.path.splitext(source)[1].lower()
+                        images[source] = f"images/image{len(images) + 1:05d}{extension}"
+                        new_images.append(source)
+                    return f"../{images[source]}"
+
+                name = f"text/chapter{index:04d}.xhtml"
+                body = engine.render_blocks(blocks, image_src, nest_captions=True)
+                zf.writestr(f"OEBPS/{name}", _xhtml(title or book_title, body))
+                chapters.append((name, title))
+                # Images are already compressed; copy them in one at a time.
+                for source in new_images:
+                    zf.write(source, f"OEBPS/{images[source]}", compress_type=zipfile.ZIP_STORED)
+
+            nav_items = "\n".join(f'        <li><a href="{name}">{html.escape(title or f"Part {number}")}</a></li>'
+                                  for number, (name, title) in enumerate(chapters, start=1)
+                                  if title or number == 1)
+            zf.writestr("OEBPS/nav.xhtml", _xhtml("Contents", f"""    <nav epub:type="toc" id="toc">
+      <h1>Contents</h1>
+      <ol>
+{nav_items}
+      </ol>
+    </nav>""", stylesheet="style.css"))
+            zf.writestr("OEBPS/content.opf", EpubGenerator._package_document(book_title, chapters, images))
+        instrumentation.count("epub_chapters", len(chapters))
+
+    @staticmethod
+    def _package_document(book_title, chapters, images):
+        identifier = uuid.uuid5(uuid.NAMESPACE_URL, f"bookalchemist:{book_title}")
+        modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        manifest = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+                    '<item id="css" href="style.css" media-type="text/css"/>']
+        manifest += [f'<item id="ch{index}" href="{name}" media-type="application/xhtml+xml"/>'
+                     for index, (name, _) in enumerate(chapters, start=1)]
+        manifest += [f'<item id="img{index}" href="{name}" '
+                     f'media-type="{MEDIA_TYPES.get(os.path.splitext(name)[1], "image/png")}"/>'
+                     for index, name in enumerate(images.values(), start=1)]
+        spine = "".join(f'<itemref idref="ch{index}"/>' for index in range(1, len(chapters) + 1))
+        items = "\n    ".join(manifest)
+        return f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:uuid:{identifier}</dc:identifier>
+    <dc:title>{html.escape(book_title)}</dc:title>
+    <dc:language>en</dc:language>
+    <meta property="dcterms:modified">{modified}</meta>
+  </metadata>
+  <manifest>
+    {items}
+  </manifest>
+  <spine>{spine}</spine>
+</package>"""
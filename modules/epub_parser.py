@@ -3,6 +3,7 @@
 import ebooklib
 from ebooklib import epub
 from bs4 import BeautifulSoup
+from modules import instrumentation, profiling
 
 class EpubParser:
     """
@@ -12,15 +13,21 @@ class EpubParser:
     def __init__(self, file_path):
         self.file_path = file_path
 
-    def extract_structured_content(self):
+    @profiling.profiled("parse", book=lambda args: profiling.book_name_from_path(args["self"].file_path))
+    @instrumentation.timed("parse", format="epub")
+    def extract_structured_content(self, progress_callback=None):
         """
         Reads the EPUB, parses its XHTML chapters, and extracts text.
+        progress_callback(stage, fraction) is called once per document, if given.
         """
         book = epub.read_epub(self.file_path)
         structured_content = []
 
         # EPUBs are made of "items". We want the HTML documents.
-        for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
+        documents = list(book.get_items_of_type(ebooklib.ITEM_DOCUMENT))
+        for index, item in enumerate(documents):
+            if progress_callback:
+                progress_callback("parse", index / len(documents))
             # The content is XHTML, so we use BeautifulSoup to parse it.
             soup = BeautifulSoup(item.get_body_content(), 'lxml')
 
@@ -0,0 +1,72 @@
+# BookAlchemist/modules/fake_providers.py
+#
+# Deterministic, offline stand-ins for the embedding model and the LLM, used
+# by the "fake" AI provider for local testing of the server and benchmarks.
+
+import hashlib
+import re
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors: texts that share words get similar vectors,
+    so retrieval and the semantic cache behave plausibly, and the same text
+    always maps to the same vector in every process.
+    """
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+            norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class FakeLLM(LLM):
+    """
+    Answers with the first words of the prompt's context, streamed word by
+    word. token_delay simulates generation speed (seconds per word).
+    """
+    max_words: int = 40
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _words(self, prompt):
+        context = prompt.split("Context:", 1)[-1].split("Question:", 1)[0]
+        words = context.split()[:self.max_words]
+        return ["Based", "on", "the", "book:"] + words if words else ["I", "don't", "know."]
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        for index, word in enumerate(self._words(prompt)):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = GenerationChunk(text=word if index == 0 else " " + word)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
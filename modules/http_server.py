@@ -0,0 +1,335 @@
+# BookAlchemist/modules/http_server.py
+#
+# A small local HTTP/1.1 service on top of the existing pipeline, built on
+# asyncio streams so it needs no web framework:
+#
+#   GET  /health                                   -> queue depths per stage
+#   GET  /metrics                                  -> Prometheus text (BOOKALCHEMIST_METRICS=1)
+#   POST /parse   {"path": "/books/x.pdf"}         -> {"book_id", "blocks", ...}
+#   POST /render  {"book_id": "x", "theme": "...", "format": "pdf"|"epub"} -> {"pdf_path"|"epub_path", ...}
+#   POST /ingest  {"book_id": "x"}                 -> {"rebuilt": true}
+#   POST /ask     {"book_ids": ["x"], "question": "..."} -> streamed text/plain
+#
+# Parsing and rendering run in process pools, ingestion and answers run on
+# threads next to the one warm model. Each stage admits a bounded number of
+# requests (running + waiting); beyond that the server answers 503 with
+# Retry-After instead of queueing without limit.
+
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules.batch_processor import (CONTENT_NAME, OUTPUT_FORMATS, book_id_for, default_assistant_factory,
+                                     load_content, parse_book, process_pool, render_book)
+from modules.styling_engine import StylingEngine
+from modules import instrumentation
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Book IDs become folder names under output_dir, so nothing that could leave it.
+BOOK_ID_PATTERN = re.compile(r"^[\w.-]+$")
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class StageQueue:
+    """An executor plus an admission limit: at most `workers` running and `max_waiting` queued."""
+    def __init__(self, name, executor, workers, max_waiting):
+        self.name = name
+        self.executor = executor
+        self.limit = workers + max_waiting
+        self.in_flight = 0
+
+    def admit(self):
+        if self.in_flight >= self.limit:
+            raise HTTPError(503, f"The {self.name} queue is full, try again shortly.", {"Retry-After": "5"})
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+
+    async def run(self, func, *args):
+        self.admit()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.release()
+
+
+class BookAlchemistServer:
+    def __init__(self, output_dir=os.path.join("output_docs", "server"), parse_workers=2, render_workers=1,
+                 ask_workers=4, max_waiting=8, assistant_factory=default_assistant_factory):
+        self.output_dir = output_dir
+        self.assistant_factory = assistant_factory
+        self.assistant = None
+        self.semantic_cache = None
+        self.parse_workers = parse_workers
+        self.render_workers = render_workers
+        self.ask_workers = ask_workers
+        self.max_waiting = max_waiting
+        self.stages = {}
+        self.server = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    # --- Lifecycle ---
+
+    async def start(self, host="127.0.0.1", port=8765):
+        loop = asyncio.get_running_loop()
+        # Load the models before accepting connections, so the first question isn't slow.
+        self.assistant, self.semantic_cache = await loop.run_in_executor(None, self.assistant_factory)
+        ask_workers = self.assistant._max_workers(self.ask_workers)
+        self.stages = {
+            "parse": StageQueue("parse", process_pool(self.parse_workers), self.parse_workers, self.max_waiting),
+            "render": StageQueue("render", process_pool(self.render_workers), self.render_workers, self.max_waiting),
+            # One ingest at a time: the vector store and BM25 files are written in place.
+            "ingest": StageQueue("ingest", ThreadPoolExecutor(1), 1, self.max_waiting),
+            "ask": StageQueue("ask", ThreadPoolExecutor(ask_workers), ask_workers, self.max_waiting),
+        }
+        self.server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        print(f"🌐 Book Alchemist server listening on http://{host}:{self.port}")
+        return self.server
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        await self.start(host, port)
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.server:
+            self.server.close()
+        for stage in self.stages.values():
+            stage.executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- HTTP plumbing ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, body = await self._read_request(reader)
+                await self._route(method, path, body, writer)
+            except HTTPError as e:
+                await self._send_json(writer, e.status, {"error": str(e)}, e.headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except Exception as e:
+                print(f"❌ Server error: {e}")
+                await self._send_json(writer, 500, {"error": str(e)})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(413, "Request headers are too large.")
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body is too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], body
+
+    @staticmethod
+    def _head(status, content_type, headers=None, length=None):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}",
+                 "Connection: close"]
+        if length is None:
+            lines.append("Transfer-Encoding: chunked")
+        else:
+            lines.append(f"Content-Length: {length}")
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+    async def _send_text(self, writer, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode('utf-8')
+        writer.write(self._head(status, content_type, None, len(body)) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(self._head(status, "application/json", headers, len(body)) + body)
+        await writer.drain()
+
+    # --- Endpoints ---
+
+    async def _route(self, method, path, body, writer):
+        routes = {"/parse": self._parse, "/render": self._render, "/ingest": self._ingest}
+        if path == "/health":
+            await self._send_json(writer, 200, {"status": "ok", "in_flight": {
+                name: stage.in_flight for name, stage in self.stages.items()}})
+            return
+        if path == "/metrics":
+            if not instrumentation.is_enabled():
+                raise HTTPError(404, "Metrics are disabled, start the server with BOOKALCHEMIST_METRICS=1.")
+            await self._send_text(writer, 200, instrumentation.prometheus_text(), "text/plain; version=0.0.4")
+            return
+        if path not in routes and path != "/ask":
+            raise HTTPError(404, f"Unknown endpoint: {path}")
+        if method != "POST":
+            raise HTTPError(405, "Use POST.")
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HTTPError(400, "The body must be JSON.")
+        if not isinstance(request, dict):
+            raise HTTPError(400, "The body must be a JSON object.")
+        if path == "/ask":
+            await self._ask(request, writer)
+        else:
+            await self._send_json(writer, 200, await routes[path](request))
+
+    def _content_path(self, book_id):
+        path = os.path.join(self.output_dir, book_id, CONTENT_NAME)
+        if not os.path.exists(path):
+            raise HTTPError(404, f"Book '{book_id}' has not been parsed yet.")
+        return path
+
+    @staticmethod
+    def _require(request, field):
+        value = request.get(field)
+        if not value:
+            raise HTTPError(400, f"Missing '{field}'.")
+        return value
+
+    @staticmethod
+    def _check_book_id(book_id):
+        if not isinstance(book_id, str) or not BOOK_ID_PATTERN.match(book_id) or ".." in book_id:
+            raise HTTPError(400, f"Invalid book ID {book_id!r}: use letters, digits, '_', '-' and '.' only.")
+        return book_id
+
+    async def _parse(self, request):
+        path = self._require(request, "path")
+        if not os.path.isfile(path):
+            raise HTTPError(404, f"No such file: {path}")
+        # IDs derived from file names like "Emma (1).pdf" are made safe instead of rejected.
+        book_id = self._check_book_id(request.get("book_id") or re.sub(r"[^\w.-]", "_", book_id_for(path)))
+        result = await self.stages["parse"].run(parse_book, os.path.abspath(path),
+                                                os.path.join(self.output_dir, book_id))
+        instrumentation.merge(result.pop("metrics", None))
+        return {"book_id": book_id, **result}
+
+    async def _render(self, request):
+        book_id = self._check_book_id(self._require(request, "book_id"))
+        theme = request.get("theme", StylingEngine.THEMES[0])
+        if theme not in StylingEngine.THEMES:
+            raise HTTPError(400, f"Unknown theme '{theme}'.")
+        output_format = request.get("format", "pdf")
+        if output_format not in OUTPUT_FORMATS:
+            raise HTTPError(400, f"Unknown format '{output_format}'.")
+        output_path = os.path.join(self.output_dir, book_id, f"{book_id}_{theme}.{output_format}")
+        result = await self.stages["render"].run(render_book, self._content_path(book_id), theme, output_path,
+                                                 book_id, output_format)
+        instrumentation.merge(result.pop("metrics", None))
+        return {"book_id": book_id, **result}
+
+    async def _ingest(self, request):
+        book_id = self._check_book_id(self._require(request, "book_id"))
+        content_path = self._content_path(book_id)
+
+        def ingest():
+            content = load_content(content_path)
+            rebuilt = self.assistant.ingest_document(content["structured_content"], book_id)
+            if rebuilt:
+                self.semantic_cache.invalidate_book(book_id)
+            return rebuilt
+
+        return {"book_id": book_id, "rebuilt": await self.stages["ingest"].run(ingest)}
+
+    async def _ask(self, request, writer):
+        question = self._require(request, "question")
+        book_ids = request.get("book_ids") or [self._require(request, "book_id")]
+        if not isinstance(book_ids, list) or not all(isinstance(book_id, str) for book_id in book_ids):
+            raise HTTPError(400, "'book_ids' must be a list of book ID strings.")
+        for book_id in book_ids:
+            self._check_book_id(book_id)
+        loop = asyncio.get_running_loop()
+        # Opening the library index can touch the disk, so it is checked off the event loop.
+        ingested = await loop.run_in_executor(None, lambda: [self.assistant.has_book(b) for b in book_ids])
+        missing = [book_id for book_id, present in zip(book_ids, ingested) if not present]
+        if missing:
+            raise HTTPError(404, f"Book(s) not ingested yet: {', '.join(missing)}.")
+        stage = self.stages["ask"]
+        stage.admit()
+        try:
+            chunks = asyncio.Queue()
+            stop = threading.Event()
+            # The semantic cache is per book, so only single-book questions use it.
+            cache_key = book_ids[0] if len(book_ids) == 1 else None
+
+            def produce():
+                # Runs on an ask worker; hands each piece of the answer to the event loop.
+                try:
+                    cached = cache_key and self.semantic_cache.get_similar_answer(cache_key, question)
+                    if cached:
+                        loop.call_soon_threadsafe(chunks.put_nowait, cached)
+                        return
+                    parts = []
+                    for text in self.assistant.ask_stream(question, book_ids=book_ids):
+                        if stop.is_set():
+                            return
+                        parts.append(text)
+                        loop.call_soon_threadsafe(chunks.put_nowait, text)
+                    # ask_stream reports failures as its last piece; those must not be served again.
+                    failed = parts and parts[-1].startswith(("An error occurred:", "Error:"))
+                    if cache_key and not failed:
+                        self.semantic_cache.add_answer(cache_key, question, "".join(parts))
+                except Exception as e:
+                    loop.call_soon_threadsafe(chunks.put_nowait, f"An error occurred: {e}")
+                finally:
+                    loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+            producer = loop.run_in_executor(stage.executor, produce)
+            writer.write(self._head(200, "text/plain; charset=utf-8"))
+            try:
+                while (text := await chunks.get()) is not None:
+                    data = text.encode('utf-8')
+                    if data:
+                        writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+                        await writer.drain()
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+            finally:
+                # Stop generating if the client went away mid-answer.
+                stop.set()
+                await producer
+        finally:
+            stage.release()
+
+
+def run_server(host="127.0.0.1", port=8765, **options):
+    server = BookAlchemistServer(**options)
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        print("👋 Server stopped.")
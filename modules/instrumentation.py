@@ -0,0 +1,296 @@
+# BookAlchemist/modules/instrumentation.py
+#
+# Lightweight pipeline metrics: timed spans, counters and resident-memory
+# samples, aggregated in-process and exported as Prometheus text, JSON lines
+# or a snapshot dict for the GUI stats panel.
+#
+# Metrics are off unless BOOKALCHEMIST_METRICS=1 is set or enable() is called.
+# While off, span() returns one shared no-op object and count() returns right
+# away, so instrumented code pays a function call and a flag check.
+#
+#   BOOKALCHEMIST_METRICS=1                    turn metrics on
+#   BOOKALCHEMIST_METRICS_JSONL=metrics.jsonl  also append every span as a JSON line
+#   BOOKALCHEMIST_METRICS_PROM=metrics.prom    write a Prometheus textfile at exit
+
+import atexit
+import functools
+import inspect
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+RSS_SAMPLE_INTERVAL = 0.1
+
+_enabled = False
+_lock = threading.Lock()
+_spans = {}
+_counters = {}
+_memory = {"rss_bytes": 0, "peak_rss_bytes": 0, "sampled_at": 0.0}
+_jsonl_file = None
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record_span(self.name, self.labels, time.perf_counter() - self.start, exc_type is not None)
+        return False
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(jsonl_path=None):
+    """Turns metrics on; with jsonl_path every finished span is also appended to that file."""
+    global _enabled, _jsonl_file
+    with _lock:
+        if jsonl_path and _jsonl_file is None:
+            _jsonl_file = open(jsonl_path, 'a', encoding='utf-8')
+        _enabled = True
+
+
+def disable():
+    global _enabled, _jsonl_file
+    with _lock:
+        _enabled = False
+        if _jsonl_file:
+            _jsonl_file.close()
+            _jsonl_file = None
+
+
+def span(name, **labels):
+    """Context manager that times a block as one observation of `name`."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name, labels)
+
+
+def timed(name, **labels):
+    """Decorator form of span(), for plain and async functions."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                with _Span(name, labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(name, seconds, **labels):
+    """Records a duration that was measured elsewhere, as if it were a span."""
+    if _enabled:
+        _record_span(name, labels, seconds, False)
+
+
+def count(name, value=1, **labels):
+    if not _enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _read_rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def sample_memory(force=False):
+    """Samples resident memory (at most every RSS_SAMPLE_INTERVAL seconds unless forced)."""
+    now = time.monotonic()
+    if not force and now - _memory["sampled_at"] < RSS_SAMPLE_INTERVAL:
+        return _memory["rss_bytes"]
+    rss = _read_rss_bytes()
+    with _lock:
+        _memory["rss_bytes"] = rss
+        _memory["peak_rss_bytes"] = max(_memory["peak_rss_bytes"], rss)
+        _memory["sampled_at"] = now
+    return rss
+
+
+def _record_span(name, labels, seconds, failed):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        stats = _spans.get(key)
+        if stats is None:
+            stats = _spans[key] = {"count": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0}
+        stats["count"] += 1
+        stats["total_s"] += seconds
+        stats["max_s"] = max(stats["max_s"], seconds)
+        stats["errors"] += failed
+        if _jsonl_file:
+            _jsonl_file.write(json.dumps({"ts": time.time(), "span": name, "labels": labels,
+                                          "seconds": round(seconds, 6), "error": failed}) + "\n")
+            _jsonl_file.flush()
+    sample_memory()
+
+
+def snapshot():
+    """A JSON-serializable copy of everything recorded so far."""
+    with _lock:
+        return {
+            "spans": [{"name": name, "labels": dict(labels), **stats} for (name, labels), stats in _spans.items()],
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in _counters.items()],
+            "memory": {"rss_bytes": _memory["rss_bytes"], "peak_rss_bytes": _memory["peak_rss_bytes"]},
+        }
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _memory.update(rss_bytes=0, peak_rss_bytes=0, sampled_at=0.0)
+
+
+def collect_and_reset():
+    """Snapshot then reset, for worker processes handing their metrics to the parent."""
+    if not _enabled:
+        return None
+    sample_memory(force=True)
+    data = snapshot()
+    reset()
+    return data
+
+
+def merge(data):
+    """Adds a snapshot taken in another process (see collect_and_reset) to this one."""
+    if not _enabled or not data:
+        return
+    with _lock:
+        for entry in data["spans"]:
+            key = (entry["name"], tuple(sorted(entry["labels"].items())))
+            stats = _spans.setdefault(key, {"count": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0})
+            stats["count"] += entry["count"]
+            stats["total_s"] += entry["total_s"]
+            stats["max_s"] = max(stats["max_s"], entry["max_s"])
+            stats["errors"] += entry["errors"]
+        for entry in data["counters"]:
+            key = (entry["name"], tuple(sorted(entry["labels"].items())))
+            _counters[key] = _counters.get(key, 0) + entry["value"]
+        # Worker memory is reported as the largest single process seen.
+        _memory["peak_rss_bytes"] = max(_memory["peak_rss_bytes"], data["memory"]["peak_rss_bytes"])
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_text():
+    """Renders the current metrics in the Prometheus text exposition format."""
+    sample_memory(force=True)
+    data = snapshot()
+    lines = ["# HELP bookalchemist_span_seconds Time spent in each pipeline stage.",
+             "# TYPE bookalchemist_span_seconds summary"]
+    for entry in data["spans"]:
+        labels = _prometheus_labels({"span": entry["name"], **entry["labels"]})
+        lines.append(f"bookalchemist_span_seconds_count{labels} {entry['count']}")
+        lines.append(f"bookalchemist_span_seconds_sum{labels} {entry['total_s']:.6f}")
+    lines += ["# HELP bookalchemist_span_max_seconds Slowest single observation of each stage.",
+              "# TYPE bookalchemist_span_max_seconds gauge"]
+    for entry in data["spans"]:
+        lines.append(f"bookalchemist_span_max_seconds{_prometheus_labels({'span': entry['name'], **entry['labels']})} "
+                     f"{entry['max_s']:.6f}")
+    lines += ["# HELP bookalchemist_span_errors_total Stage runs that raised.",
+              "# TYPE bookalchemist_span_errors_total counter"]
+    for entry in data["spans"]:
+        lines.append(f"bookalchemist_span_errors_total{_prometheus_labels({'span': entry['name'], **entry['labels']})} "
+                     f"{entry['errors']}")
+    lines += ["# HELP bookalchemist_events_total Pipeline event counters.",
+              "# TYPE bookalchemist_events_total counter"]
+    for entry in data["counters"]:
+        lines.append(f"bookalchemist_events_total{_prometheus_labels({'event': entry['name'], **entry['labels']})} "
+                     f"{entry['value']}")
+    lines += ["# HELP bookalchemist_resident_memory_bytes Resident memory at the last sample.",
+              "# TYPE bookalchemist_resident_memory_bytes gauge",
+              f"bookalchemist_resident_memory_bytes {data['memory']['rss_bytes']}",
+              "# HELP bookalchemist_peak_resident_memory_bytes Highest sampled resident memory.",
+              "# TYPE bookalchemist_peak_resident_memory_bytes gauge",
+              f"bookalchemist_peak_resident_memory_bytes {data['memory']['peak_rss_bytes']}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path):
+    """Writes a Prometheus textfile (e.g. for node_exporter's textfile collector) atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+def format_table():
+    """A plain-text summary for the GUI stats panel."""
+    data = snapshot()
+    lines = [f"{'stage':<28}{'count':>7}{'total':>10}{'mean':>10}{'max':>10}"]
+    for entry in sorted(data["spans"], key=lambda e: -e["total_s"]):
+        label = entry["name"] + "".join(f" {value}" for value in entry["labels"].values())
+        lines.append(f"{label[:27]:<28}{entry['count']:>7}{entry['total_s']:>9.2f}s"
+                     f"{entry['total_s'] / entry['count']:>9.3f}s{entry['max_s']:>9.3f}s")
+    if data["counters"]:
+        lines.append("")
+        for entry in sorted(data["counters"], key=lambda e: e["name"]):
+            label = entry["name"] + "".join(f" {value}" for value in entry["labels"].values())
+            lines.append(f"{label:<35}{entry['value']:>10}")
+    memory = data["memory"]
+    lines.append("")
+    lines.append(f"RSS {memory['rss_bytes'] / 2**20:.0f} MB, peak {memory['peak_rss_bytes'] / 2**20:.0f} MB")
+    return "\n".join(lines)
+
+
+def _configure_from_environment():
+    if os.environ.get("BOOKALCHEMIST_METRICS", "").lower() not in ("1", "true", "yes", "on"):
+        return
+    enable(os.environ.get("BOOKALCHEMIST_METRICS_JSONL") or None)
+    prom_path = os.environ.get("BOOKALCHEMIST_METRICS_PROM")
+    # Pool workers inherit the environment; only the main process owns the textfile.
+    if prom_path and multiprocessing.parent_process() is None:
+        atexit.register(write_prometheus, prom_path)
+
+
+_configure_from_environment()
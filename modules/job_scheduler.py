@@ -0,0 +1,190 @@
+# BookAlchemist/modules/job_scheduler.py
+
+import itertools
+import queue
+import threading
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when its cancellation token has been triggered."""
+
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled()
+
+
+class Job:
+    """
+    One unit of background work. The function receives the job itself, so it
+    can report progress with job.report() (which also honours cancellation)
+    and hand UI updates to the main thread with job.post().
+    """
+    def __init__(self, scheduler, name, func, args, priority, key, on_done, on_error, on_progress, on_cancel):
+        self.scheduler = scheduler
+        self.name = name
+        self.func = func
+        self.args = args
+        self.priority = priority
+        self.key = key
+        self.token = CancellationToken()
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancel = on_cancel
+
+    def cancel(self):
+        self.token.cancel()
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def report(self, stage, fraction=None, message=None):
+        """Publishes progress for a stage (fraction in 0..1 or None) and checks for cancellation."""
+        self.token.check()
+        if self.on_progress:
+            self.scheduler.post(self.on_progress, self, stage, fraction, message)
+
+    def post(self, callback, *args):
+        self.scheduler.post(callback, *args)
+
+
+class JobScheduler:
+    """
+    A bounded pool of worker threads that runs jobs by priority (lower runs
+    first). Workers never touch the UI directly: callbacks are queued with
+    post() and run on the main thread by whoever drains the event queue,
+    normally a TkEventPump.
+
+    Jobs submitted with a key are exclusive: while a job with that key is
+    queued or running, further submissions with the same key are refused.
+    """
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
+        self._jobs = queue.PriorityQueue()
+        self._events = queue.SimpleQueue()
+        self._sequence = itertools.count()
+        self._active = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._shutdown = False
+
+    def submit(self, name, func, *args, priority=PRIORITY_NORMAL, key=None,
+               on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        """Queues func(job, *args). Returns the Job, or None if its key is already busy."""
+        job = Job(self, name, func, args, priority, key, on_done, on_error, on_progress, on_cancel)
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down.")
+            if key is not None:
+                if key in self._active:
+                    return None
+                self._active[key] = job
+            self._pending.add(job)
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{len(self._workers)}", daemon=True)
+                self._workers.append(worker)
+                worker.start()
+        self._jobs.put((priority, next(self._sequence), job))
+        return job
+
+    def post(self, callback, *args):
+        """Queues a callback to be run on the UI thread."""
+        self._events.put((callback, args))
+
+    def drain_events(self, max_events=100):
+        """Runs up to max_events queued UI callbacks. Call this from the UI thread only."""
+        for _ in range(max_events):
+            try:
+                callback, args = self._events.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in UI callback {getattr(callback, '__name__', callback)}: {e}")
+
+    def cancel_all(self):
+        with self._lock:
+            jobs = list(self._pending)
+        for job in jobs:
+            job.cancel()
+
+    def shutdown(self):
+        """Cancels every job and stops the workers once their current job ends."""
+        self.cancel_all()
+        with self._lock:
+            self._shutdown = True
+            workers = len(self._workers)
+        for _ in range(workers):
+            self._jobs.put((float('inf'), next(self._sequence), None))
+
+    def _worker_loop(self):
+        while True:
+            _, _, job = self._jobs.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _run(self, job):
+        try:
+            job.token.check()
+            result = job.func(job, *job.args)
+        except JobCancelled:
+            if job.on_cancel:
+                self.post(job.on_cancel, job)
+        except Exception as e:
+            if job.on_error:
+                self.post(job.on_error, job, e)
+            else:
+                print(f"❌ Job '{job.name}' failed: {e}")
+        else:
+            if job.on_done:
+                self.post(job.on_done, job, result)
+        finally:
+            with self._lock:
+                self._pending.discard(job)
+                if job.key is not None and self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+
+class TkEventPump:
+    """
+    Drains a scheduler's UI callbacks on the Tk main loop, in batches, via
+    a single repeating after() call.
+    """
+    def __init__(self, widget, scheduler, interval_ms=50, batch_size=100):
+        self.widget = widget
+        self.scheduler = scheduler
+        self.interval_ms = interval_ms
+        self.batch_size = batch_size
+        self._after_id = None
+
+    def start(self):
+        self._after_id = self.widget.after(self.interval_ms, self._pump)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _pump(self):
+        self.scheduler.drain_events(self.batch_size)
+        self._after_id = self.widget.after(self.interval_ms, self._pump)
@@ -0,0 +1,125 @@
+# BookAlchemist/modules/lexical_index.py
+
+import json
+import math
+import os
+import re
+from collections import Counter
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Words that carry no signal for keyword search. Kept short on purpose:
+# names, numbers and rare words are exactly what this index is for.
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have he her his how i if in into is it its
+me my no not of on or our she so that the their them then there these they this to was we were what
+when where which who whom why will with would you your about tell does said
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    A compact BM25 inverted index over the chunks of one book.
+    Row numbers are the chunk numbers used by the vector store.
+    """
+    def __init__(self, postings=None, doc_lengths=None, k1=1.5, b=0.75):
+        self.postings = postings or {}
+        self.doc_lengths = np.asarray(doc_lengths or [], dtype=np.float32)
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, texts, k1=1.5, b=0.75):
+        postings = {}
+        doc_lengths = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                # Flat [row, tf, row, tf, ...] lists keep the JSON file small.
+                postings.setdefault(term, []).extend((row, tf))
+        return cls(postings, doc_lengths, k1, b)
+
+    def save(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'k1': self.k1, 'b': self.b, 'doc_lengths': self.doc_lengths.astype(int).tolist(),
+                       'postings': self.postings}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['postings'], data['doc_lengths'], data['k1'], data['b'])
+
+    def search(self, query, k=4):
+        """Returns up to k (row, score) pairs, best first."""
+        n_docs = len(self.doc_lengths)
+        if n_docs == 0:
+            return []
+        avg_length = float(self.doc_lengths.mean()) or 1.0
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            flat = self.postings.get(term)
+            if not flat:
+                continue
+            pairs = np.asarray(flat, dtype=np.float32).reshape(-1, 2)
+            rows = pairs[:, 0].astype(np.int64)
+            tf = pairs[:, 1]
+            df = len(rows)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[rows] / avg_length)
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        top = matched[np.argsort(-scores[matched], kind='stable')[:k]]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+class LexicalLibraryIndex:
+    """
+    Per-book BM25 indexes stored as JSON files next to the vector store.
+    Books are only read from disk the first time they are searched.
+    """
+    def __init__(self, persist_directory):
+        self.persist_directory = persist_directory
+        self._books = {}
+        os.makedirs(self.persist_directory, exist_ok=True)
+
+    def _book_path(self, book_id):
+        return os.path.join(self.persist_directory, f"{book_id}.json")
+
+    def has_book(self, book_id):
+        return book_id in self._books or os.path.exists(self._book_path(book_id))
+
+    def add_book(self, book_id, texts):
+        index = BM25Index.build(texts)
+        index.save(self._book_path(book_id))
+        self._books[book_id] = index
+
+    def delete_book(self, book_id):
+        self._books.pop(book_id, None)
+        if os.path.exists(self._book_path(book_id)):
+            os.remove(self._book_path(book_id))
+
+    def _get_book(self, book_id):
+        if book_id not in self._books:
+            self._books[book_id] = BM25Index.load(self._book_path(book_id))
+        return self._books[book_id]
+
+    def search(self, query, k=4, book_ids=()):
+        """Returns up to k (book_id, row, score) tuples across the given books."""
+        results = []
+        for book_id in book_ids:
+            if self.has_book(book_id):
+                results.extend((book_id, row, score) for row, score in self._get_book(book_id).search(query, k))
+        results.sort(key=lambda r: -r[2])
+        return results[:k]
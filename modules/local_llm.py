@@ -0,0 +1,95 @@
+# BookAlchemist/modules/local_llm.py
+
+import os
+import threading
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+DEFAULT_MODEL_PATH = os.path.join("models", "mistral-7b-instruct-v0.2.q4_k_m.gguf")
+
+_shared_models = {}
+_shared_models_lock = threading.Lock()
+
+
+def default_thread_count():
+    # llama.cpp is fastest with one thread per physical core; half the
+    # logical CPUs is a good guess on machines with hyper-threading.
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class SharedLlama:
+    """
+    One loaded llama.cpp model plus the lock that serializes access to it.
+    Instances are shared process-wide through get_shared_llama().
+    """
+    def __init__(self, model_path, n_ctx, n_threads, n_batch, n_gpu_layers):
+        from llama_cpp import Llama
+        self.lock = threading.RLock()
+        self.client = Llama(
+            model_path=model_path, n_ctx=n_ctx, n_threads=n_threads,
+            n_batch=n_batch, n_gpu_layers=n_gpu_layers, verbose=False
+        )
+        self.prefix_tokens = []
+
+    def prime_prefix(self, prefix):
+        """
+        Evaluates the static start of every prompt once. llama.cpp keeps the KV
+        cache of the last prompt and only evaluates the tokens after the longest
+        common prefix, so later questions skip this part entirely.
+        """
+        tokens = self.client.tokenize(prefix.encode('utf-8'))
+        with self.lock:
+            if tokens == self.prefix_tokens:
+                return
+            self.client.reset()
+            self.client.eval(tokens)
+            self.prefix_tokens = tokens
+
+    def complete(self, prompt, max_tokens, temperature, stop=None):
+        with self.lock:
+            result = self.client.create_completion(
+                prompt, max_tokens=max_tokens, temperature=temperature, stop=stop or []
+            )
+        return result['choices'][0]['text']
+
+    def stream(self, prompt, max_tokens, temperature, stop=None):
+        """Yields the completion piece by piece; the model stays locked until it finishes."""
+        with self.lock:
+            for part in self.client.create_completion(
+                prompt, max_tokens=max_tokens, temperature=temperature, stop=stop or [], stream=True
+            ):
+                yield part['choices'][0]['text']
+
+
+def get_shared_llama(model_path=DEFAULT_MODEL_PATH, n_ctx=4096, n_threads=None, n_batch=512, n_gpu_layers=-1):
+    """Loads a model once per process and settings; later calls reuse it."""
+    n_threads = n_threads or default_thread_count()
+    key = (os.path.abspath(model_path), n_ctx, n_threads, n_batch, n_gpu_layers)
+    with _shared_models_lock:
+        if key not in _shared_models:
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"Local model not found at {model_path}. Please run install.bat.")
+            print(f"⏳ Loading local model ({n_threads} threads, batch size {n_batch})...")
+            _shared_models[key] = SharedLlama(model_path, n_ctx, n_threads, n_batch, n_gpu_layers)
+        return _shared_models[key]
+
+
+class SharedLlamaCpp(LLM):
+    """LangChain LLM backed by a SharedLlama, safe to call from several threads."""
+    model: object
+    max_tokens: int = 512
+    temperature: float = 0.2
+
+    @property
+    def _llm_type(self):
+        return "shared_llama_cpp"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return self.model.complete(prompt, self.max_tokens, self.temperature, stop)
+
+    def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+        for text in self.model.stream(prompt, self.max_tokens, self.temperature, stop):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
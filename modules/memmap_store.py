@@ -0,0 +1,182 @@
+# BookAlchemist/modules/memmap_store.py
+
+import json
+import os
+import shutil
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+class _BookVectors:
+    """The memory-mapped vectors and text sidecar of one book."""
+    def __init__(self, book_dir):
+        with open(os.path.join(book_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        # mmap_mode='r' means opening only maps the file, nothing is read yet.
+        self.vectors = np.load(os.path.join(book_dir, "vectors.npy"), mmap_mode='r')
+        self.scales = None
+        if self.meta['dtype'] == 'int8':
+            self.scales = np.load(os.path.join(book_dir, "scales.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(book_dir, "offsets.npy"), mmap_mode='r')
+        self.texts_path = os.path.join(book_dir, "texts.jsonl")
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def scores(self, query_vectors, block_rows=65536):
+        """Exact dot products of every row against (n_queries, dim) query vectors."""
+        out = np.empty((len(self), query_vectors.shape[0]), dtype=np.float32)
+        # Convert in blocks so a big book never needs a full float32 copy in memory.
+        for start in range(0, len(self), block_rows):
+            block = np.asarray(self.vectors[start:start + block_rows], dtype=np.float32)
+            out[start:start + block_rows] = block @ query_vectors.T
+        if self.scales is not None:
+            out *= np.asarray(self.scales, dtype=np.float32)[:, None]
+        return out
+
+    def get_texts(self, rows):
+        texts = []
+        with open(self.texts_path, 'rb') as f:
+            for row in rows:
+                f.seek(int(self.offsets[row]))
+                texts.append(json.loads(f.readline().decode('utf-8')))
+        return texts
+
+
+class MemmapLibraryStore:
+    """
+    A lightweight vector store for the library: every book is a folder with a
+    normalized float16 (or int8) embedding matrix that is memory-mapped on
+    demand, plus a JSON-lines sidecar holding the chunk texts. Search is an
+    exact top-k using a single NumPy matmul per book.
+    """
+    SUPPORTED_DTYPES = ('float16', 'int8')
+    EMBED_BATCH_SIZE = 256
+
+    def __init__(self, embeddings, persist_directory=os.path.join("./vector_cache", "_library"), dtype='float16'):
+        if dtype not in self.SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.embeddings = embeddings
+        self.persist_directory = persist_directory
+        self.dtype = dtype
+        self._books = {}
+        os.makedirs(self.persist_directory, exist_ok=True)
+
+    def _book_dir(self, book_id):
+        return os.path.join(self.persist_directory, book_id)
+
+    def _open_book(self, book_id):
+        if book_id not in self._books:
+            self._books[book_id] = _BookVectors(self._book_dir(book_id))
+        return self._books[book_id]
+
+    def has_book(self, book_id):
+        # meta.json is written last, so its presence means the book is complete.
+        return os.path.exists(os.path.join(self._book_dir(book_id), "meta.json"))
+
+    def add_book(self, book_id, texts, progress_callback=None):
+        """Embeds the chunks of one book and writes them to its own folder."""
+        vectors = []
+        for start in range(0, len(texts), self.EMBED_BATCH_SIZE):
+            if progress_callback:
+                progress_callback("embedding", start / len(texts))
+            vectors.extend(self.embeddings.embed_documents(texts[start:start + self.EMBED_BATCH_SIZE]))
+        self.add_vectors(book_id, texts, vectors)
+
+    def add_vectors(self, book_id, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            # A book without text (e.g. an image-only PDF) is stored as complete but empty.
+            vectors = vectors.reshape(0, 0)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+
+        book_dir = self._book_dir(book_id)
+        self._books.pop(book_id, None)
+        if os.path.exists(book_dir):
+            shutil.rmtree(book_dir)
+        os.makedirs(book_dir)
+
+        if self.dtype == 'int8':
+            # Symmetric per-row quantization; the scale turns int8 dot products back into cosines.
+            max_abs = np.abs(vectors).max(axis=1, initial=0.0)
+            max_abs[max_abs == 0] = 1.0
+            np.save(os.path.join(book_dir, "vectors.npy"), np.round(vectors / max_abs[:, None] * 127).astype(np.int8))
+            np.save(os.path.join(book_dir, "scales.npy"), (max_abs / 127).astype(np.float32))
+        else:
+            np.save(os.path.join(book_dir, "vectors.npy"), vectors.astype(np.float16))
+
+        offsets = []
+        with open(os.path.join(book_dir, "texts.jsonl"), 'wb') as f:
+            for text in texts:
+                offsets.append(f.tell())
+                f.write(json.dumps(text, ensure_ascii=False).encode('utf-8') + b"\n")
+        np.save(os.path.join(book_dir, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+        with open(os.path.join(book_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({'dtype': self.dtype, 'dim': int(vectors.shape[1]), 'count': len(texts)}, f)
+
+    def delete_book(self, book_id):
+        if not self.has_book(book_id):
+            return 0
+        with open(os.path.join(self._book_dir(book_id), "meta.json"), 'r', encoding='utf-8') as f:
+            count = json.load(f)['count']
+        # Drop the memory maps first, some platforms refuse to delete mapped files.
+        self._books.pop(book_id, None)
+        shutil.rmtree(self._book_dir(book_id))
+        return count
+
+    def similarity_search_by_vector(self, vector, k=4, book_ids=None):
+        return self.similarity_search_by_vectors([vector], k=k, book_ids=book_ids)[0]
+
+    def similarity_search_by_vectors(self, vectors, k=4, book_ids=None):
+        """Exact top-k for a batch of query vectors, one matmul per book."""
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        candidates = [[] for _ in range(len(queries))]
+        for book_id in book_ids:
+            if not self.has_book(book_id):
+                continue
+            book = self._open_book(book_id)
+            top = min(k, len(book))
+            if top == 0:
+                continue
+            scores = book.scores(queries)
+            rows = np.argpartition(-scores, top - 1, axis=0)[:top]
+            for q in range(len(queries)):
+                candidates[q].extend((float(scores[row, q]), book_id, int(row)) for row in rows[:, q])
+
+        results = []
+        for query_candidates in candidates:
+            query_candidates.sort(key=lambda c: -c[0])
+            documents = []
+            for score, book_id, row in query_candidates[:k]:
+                text = self._open_book(book_id).get_texts([row])[0]
+                documents.append(Document(page_content=text, metadata={"book_id": book_id, "chunk": row, "score": score}))
+            results.append(documents)
+        return results
+
+    def get_chunks(self, book_id, rows):
+        """Fetches chunks by their row numbers, in the order requested."""
+        texts = self._open_book(book_id).get_texts(rows)
+        return [Document(page_content=text, metadata={"book_id": book_id, "chunk": int(row)})
+                for text, row in zip(texts, rows)]
+
+    def as_retriever(self, book_ids, k=4):
+        return MemmapRetriever(store=self, book_ids=list(book_ids), k=k)
+
+
+class MemmapRetriever(BaseRetriever):
+    """LangChain retriever over a MemmapLibraryStore, scoped to a set of books."""
+    store: MemmapLibraryStore
+    book_ids: list
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        vector = self.store.embeddings.embed_query(query)
+        return self.store.similarity_search_by_vector(vector, k=self.k, book_ids=self.book_ids)
@@ -1,8 +1,11 @@
 import asyncio
 from playwright.async_api import async_playwright
+from modules import instrumentation, profiling
 
 class PDFGenerator:
     @staticmethod
+    @profiling.profiled("render", book=lambda args: profiling.book_name_from_path(args["output_path"]))
+    @instrumentation.timed("render")
     async def generate_pdf_from_html(html_content, output_path):
         """
         Takes an HTML string and saves it as a PDF at the specified path.
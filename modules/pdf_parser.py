@@ -1,13 +1,16 @@
 import fitz  # PyMuPDF
 import os
 from collections import Counter
+from modules import instrumentation, profiling
+from modules.boilerplate import BoilerplateDetector
 
 
 class PDFParser:
-    def __init__(self, file_path):
+    def __init__(self, file_path, image_output_dir=None):
         self.file_path = file_path
         self.doc = fitz.open(file_path)
-        self.image_output_dir = os.path.join("output_docs", "images")
+        # Batch runs give every book its own folder so page/image names can't collide.
+        self.image_output_dir = image_output_dir or os.path.join("output_docs", "images")
         os.makedirs(self.image_output_dir, exist_ok=True)
 
     def find_dominant_font(self):
@@ -33,15 +36,25 @@ class PDFParser:
         font_name, font_size = dominant_style
         return font_name, font_size
 
-    def extract_structured_content(self):
+    @profiling.profiled("parse", book=lambda args: profiling.book_name_from_path(args["self"].file_path))
+    @instrumentation.timed("parse", format="pdf")
+    def extract_structured_content(self, progress_callback=None):
         """
         Extract text and images with improved caption detection:
         1) Check vertical and horizontal proximity for captions.
         2) Use font size/style cues for captions.
         3) Manage Pixmap resources properly.
+        4) Tag running headers, footers and page numbers as boilerplate.
+        progress_callback(stage, fraction) is called once per page, if given.
         """
         structured_content = []
+        boilerplate = BoilerplateDetector()
+        page_count = len(self.doc)
+        instrumentation.count("pages_parsed", page_count, format="pdf")
         for page_num, page in enumerate(self.doc):
+            if progress_callback:
+                progress_callback("parse", page_num / page_count)
+            page_height = page.rect.height
             blocks = page.get_text("dict").get("blocks", [])
             image_blocks = page.get_images(full=True)
 
@@ -74,22 +87,25 @@ class PDFParser:
                         # Enhanced heuristics: detect headings by font size if available or uppercase + length
                         # Here we skip font info due to block data limitations but could integrate spans
                         if len(clean_text.split()) < 7 and clean_text.isupper():
-                            structured_content.append({'type': 'heading', 'content': clean_text})
+                            entry = {'type': 'heading', 'content': clean_text}
                         else:
-                            structured_content.append({'type': 'paragraph', 'content': clean_text})
+                            entry = {'type': 'paragraph', 'content': clean_text}
+                        structured_content.append(entry)
+                        boilerplate.observe(entry, page_num, block['bbox'], page_height)
 
                 elif block['type'] == 'image':
-                    pix = fitz.Pixmap(self.doc, block['xref'])
-                    # Convert image if color space is CMYK to RGB explicitly
-                    if pix.colorspace and pix.colorspace.n == 4:
-                        pix = fitz.Pixmap(fitz.csRGB, pix)
+                    with instrumentation.span("image_extract"):
+                        pix = fitz.Pixmap(self.doc, block['xref'])
+                        # Convert image if color space is CMYK to RGB explicitly
+                        if pix.colorspace and pix.colorspace.n == 4:
+                            pix = fitz.Pixmap(fitz.csRGB, pix)
 
-                    img_filename = f"page{block['page_num']}-img{block['img_index']}.png"
-                    img_path = os.path.join(self.image_output_dir, img_filename)
-                    pix.save(img_path)
-                    pix = None  # Free Pixmap resources
+                        img_filename = f"page{block['page_num']}-img{block['img_index']}.png"
+                        img_path = os.path.join(self.image_output_dir, img_filename)
+                        pix.save(img_path)
+                        pix = None  # Free Pixmap resources
 
-                    structured_content.append({'type': 'image', 'path': os.path.join("images", img_filename)})
+                    structured_content.append({'type': 'image', 'path': self._stored_image_path(img_path)})
 
                     # Caption detection: check next block vertical and horizontal proximity & font heuristic
                     if i + 1 < len(all_blocks) and all_blocks[i + 1]['type'] == 'text':
@@ -104,7 +120,24 @@ class PDFParser:
                                 structured_content.append({'type': 'image_caption', 'content': caption_text})
                                 i += 1  # Skip the caption block
                 i += 1
+
+        tagged = boilerplate.tag(page_count)
+        if tagged:
+            print(f"🧹 Tagged {tagged} repeated header/footer blocks as boilerplate.")
+            instrumentation.count("boilerplate_blocks", tagged, format="pdf")
         return structured_content
 
+    @staticmethod
+    def _stored_image_path(img_path):
+        """
+        Image paths are stored relative to output_docs, where StylingEngine looks
+        them up. On Windows an image on another drive has no relative path, so it
+        is stored absolute; os.path.join keeps an absolute path as it is.
+        """
+        try:
+            return os.path.relpath(img_path, "output_docs")
+        except ValueError:
+            return os.path.abspath(img_path)
+
     def close(self):
         self.doc.close()
\ No newline at end of file
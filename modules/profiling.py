@@ -0,0 +1,224 @@
+# BookAlchemist/modules/profiling.py
+#
+# On-demand profiling of pipeline stages. When switched on, each wrapped
+# stage writes per-book artifacts to profiles/<book>/<stage>-<time>.*:
+#
+#   cprofile    .pstats (load with pstats / snakeviz) and a top-40 .txt summary
+#   sample      .collapsed stacks from a sampling thread, for flamegraph.pl or speedscope
+#   tracemalloc -alloc.txt with peak traced memory and the top allocation sites
+#
+# Switch it on with BOOKALCHEMIST_PROFILE=cprofile,sample,tracemalloc (or "all"),
+# or --profile on the main.py commands. BOOKALCHEMIST_PROFILE_DIR changes the
+# output folder. When off, wrapped functions only pay one flag check.
+
+import cProfile
+import contextvars
+import functools
+import inspect
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+MODES = ("cprofile", "sample", "tracemalloc")
+DEFAULT_DIRECTORY = "profiles"
+SAMPLE_INTERVAL = 0.005
+TOP_ALLOCATIONS = 30
+
+_modes = ()
+_directory = DEFAULT_DIRECTORY
+# cProfile and tracemalloc are process-wide, so only one stage is profiled at a time.
+_busy = threading.Lock()
+_current_book = contextvars.ContextVar("profiling_book", default=None)
+
+
+def parse_modes(value):
+    value = (value or "").strip().lower()
+    if value in ("", "0", "off", "false", "no"):
+        return ()
+    if value in ("1", "all", "on", "true", "yes"):
+        return MODES
+    modes = tuple(mode.strip() for mode in value.split(",") if mode.strip())
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        raise ValueError(f"Unknown profiling mode(s): {', '.join(unknown)}. Choose from {', '.join(MODES)} or 'all'.")
+    return modes
+
+
+def configure(modes, directory=None):
+    """
+    Turns profiling on for this process and, through the environment, for
+    worker processes started afterwards.
+    """
+    global _modes, _directory
+    _modes = parse_modes(modes) if isinstance(modes, str) else tuple(modes)
+    _directory = directory or _directory
+    os.environ["BOOKALCHEMIST_PROFILE"] = ",".join(_modes)
+    os.environ["BOOKALCHEMIST_PROFILE_DIR"] = _directory
+
+
+def is_enabled():
+    return bool(_modes)
+
+
+@contextmanager
+def book_context(book):
+    """Files every stage profiled inside the block under `book`, whatever the stage itself would infer."""
+    token = _current_book.set(book)
+    try:
+        yield
+    finally:
+        _current_book.reset(token)
+
+
+def book_name_from_path(path):
+    """The app's book ID rule: file name without extension, lowercase, spaces as underscores."""
+    return os.path.splitext(os.path.basename(path))[0].lower().replace(" ", "_")
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's Python stack at a fixed interval into collapsed-stack counts."""
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _artifact_base(stage, book):
+    book = re.sub(r"[^\w.-]+", "_", book or "unknown")[:80]
+    folder = os.path.join(_directory, book)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{stage}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+
+
+def _write_artifacts(base, profile, sampler, allocations, seconds):
+    if profile is not None:
+        profile.dump_stats(f"{base}.pstats")
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(40)
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Wall time: {seconds:.3f}s\n")
+            f.write(summary.getvalue())
+    if sampler is not None:
+        with open(f"{base}.collapsed", 'w', encoding='utf-8') as f:
+            for stack, hits in sampler.stacks.most_common():
+                f.write(f"{stack} {hits}\n")
+    if allocations is not None:
+        snapshot, peak = allocations
+        statistics = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).statistics("lineno")
+        with open(f"{base}-alloc.txt", 'w', encoding='utf-8') as f:
+            f.write(f"Peak traced memory: {peak / 2**20:.1f} MB\n")
+            f.write(f"Top {TOP_ALLOCATIONS} allocation sites still held at the end of the stage:\n")
+            for stat in statistics[:TOP_ALLOCATIONS]:
+                f.write(f"{stat.size / 2**10:10.1f} KiB {stat.count:8d} blocks  {stat.traceback}\n")
+
+
+@contextmanager
+def profile_stage(stage, book=None):
+    """Profiles the enclosed block with the configured modes; a no-op when profiling is off."""
+    if not _modes or not _busy.acquire(blocking=False):
+        # Off, or another stage is already being profiled (nested or in another thread).
+        yield
+        return
+    profile = sampler = allocations = None
+    started_tracemalloc = False
+    start = time.perf_counter()
+    try:
+        if "tracemalloc" in _modes and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            started_tracemalloc = True
+        if "sample" in _modes:
+            sampler = _StackSampler(threading.get_ident())
+            sampler.start()
+        if "cprofile" in _modes:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            if sampler is not None:
+                sampler.stop()
+            if started_tracemalloc:
+                allocations = (tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            seconds = time.perf_counter() - start
+            base = _artifact_base(stage, book)
+            try:
+                _write_artifacts(base, profile, sampler, allocations, seconds)
+                print(f"📊 Profile for '{stage}' written to {base}.*")
+            except OSError as e:
+                print(f"⚠️ Could not write profile for '{stage}': {e}")
+    finally:
+        _busy.release()
+
+
+def profiled(stage, book=None):
+    """
+    Decorator form of profile_stage() for plain and async functions.
+    book(bound_arguments) returns the book name used for the artifact folder.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def book_name(args, kwargs):
+            if _current_book.get() or book is None:
+                return _current_book.get()
+            try:
+                return book(signature.bind(*args, **kwargs).arguments)
+            except Exception:
+                return None
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _modes:
+                    return await func(*args, **kwargs)
+                with profile_stage(stage, book_name(args, kwargs)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _modes:
+                return func(*args, **kwargs)
+            with profile_stage(stage, book_name(args, kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _configure_from_environment():
+    global _modes, _directory
+    try:
+        _modes = parse_modes(os.environ.get("BOOKALCHEMIST_PROFILE"))
+    except ValueError as e:
+        print(f"⚠️ {e} Profiling stays off.")
+    _directory = os.environ.get("BOOKALCHEMIST_PROFILE_DIR") or DEFAULT_DIRECTORY
+
+
+_configure_from_environment()
@@ -0,0 +1,109 @@
+# BookAlchemist/modules/retrieval.py
+
+import re
+from langchain_core.retrievers import BaseRetriever
+from modules import instrumentation
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+# Quoted phrases and "chapter 12" style references are answered better by
+# exact keyword matching than by embeddings.
+QUOTED_PHRASE = re.compile(r'["“]([^"”]{3,})["”]')
+# Well-formed roman numerals only, so words like "did" or "mild" don't count.
+# A lone "I" is left out: "the letter I received" is a pronoun, not letter one.
+ROMAN_NUMERAL = r"(?!i\b)m{0,3}(?:c[md]|d?c{0,3})(?:x[cl]|l?x{0,3})(?:i[xv]|v?i{0,3})(?<=[mdclxvi])"
+NUMBERED_REFERENCE = re.compile(r"\b(chapter|section|part|page|volume|book|letter)\s+([0-9]+|" + ROMAN_NUMERAL + r")\b",
+                                re.IGNORECASE)
+
+
+def is_lexical_query(query):
+    return bool(QUOTED_PHRASE.search(query) or NUMBERED_REFERENCE.search(query))
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves chunks for the active books from the vector store, the BM25
+    index, or both fused with Reciprocal Rank Fusion. In hybrid mode, queries
+    that are clearly lexical skip the embedding call entirely.
+    """
+    vector_store: object
+    lexical_index: object
+    book_ids: list
+    k: int = 4
+    mode: str = "hybrid"
+    # Each side contributes this many candidates to the fusion.
+    fetch_k: int = 16
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.retrieve_many([query])[0]
+
+    @instrumentation.timed("retrieval")
+    def retrieve_many(self, queries):
+        """
+        Retrieves chunks for several queries at once: the queries that need
+        vectors are embedded in one batch and searched with one store call.
+        A single question goes through exactly the same path.
+        """
+        results = [None] * len(queries)
+        needs_vector = []
+        for i, query in enumerate(queries):
+            if self.mode == "lexical":
+                results[i] = self._lexical_search(query, self.k)
+            elif self.mode == "hybrid" and is_lexical_query(query):
+                results[i] = self._lexical_search(query, self.k)
+                if not results[i]:
+                    needs_vector.append(i)
+            else:
+                needs_vector.append(i)
+
+        if needs_vector:
+            vectors = self._embed_queries([queries[i] for i in needs_vector])
+            fetch_k = self.k if self.mode == "vector" else self.fetch_k
+            rankings = self.vector_store.similarity_search_by_vectors(vectors, k=fetch_k, book_ids=self.book_ids)
+            for i, ranking in zip(needs_vector, rankings):
+                if self.mode == "vector":
+                    results[i] = ranking
+                else:
+                    results[i] = self._fuse([ranking, self._lexical_search(queries[i], self.fetch_k)])
+        return results
+
+    def _embed_queries(self, queries):
+        embeddings = self.vector_store.embeddings
+        if hasattr(embeddings, "embed_queries"):
+            # CachedEmbeddings: memoized, and batched with other threads' questions.
+            return embeddings.embed_queries(queries)
+        return embeddings.embed_documents(queries)
+
+    def _lexical_search(self, query, k):
+        hits = self.lexical_index.search(query, k=k, book_ids=self.book_ids)
+        # One fetch per book, then back into score order.
+        rows_by_book = {}
+        for book_id, row, _ in hits:
+            rows_by_book.setdefault(book_id, []).append(row)
+        fetched = {}
+        for book_id, rows in rows_by_book.items():
+            for document in self.vector_store.get_chunks(book_id, rows):
+                fetched[(book_id, document.metadata.get("chunk"))] = document
+        documents = []
+        for book_id, row, score in hits:
+            document = fetched.get((book_id, int(row)))
+            if document is not None:
+                document.metadata["bm25"] = score
+                documents.append(document)
+
+        # Chunks that contain a quoted phrase verbatim go first.
+        phrases = [p.lower() for p in QUOTED_PHRASE.findall(query)]
+        if phrases:
+            documents.sort(key=lambda d: not any(p in d.page_content.lower() for p in phrases))
+        return documents
+
+    def _fuse(self, rankings):
+        scores, documents = {}, {}
+        for ranking in rankings:
+            for rank, document in enumerate(ranking):
+                key = (document.metadata.get("book_id"), document.metadata.get("chunk"))
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                documents.setdefault(key, document)
+        best = sorted(scores, key=lambda key: -scores[key])[:self.k]
+        return [documents[key] for key in best]
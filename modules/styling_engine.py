@@ -2,15 +2,21 @@ from pathlib import Path
 import base64
 import os
 import html
+from modules import instrumentation, profiling
+from modules.boilerplate import without_boilerplate
 
 
 class StylingEngine:
+    THEMES = ("premium_novel", "formal_textbook")
+
     def __init__(self, structured_content):
         self.content = structured_content
 
+    @profiling.profiled("html", book=lambda args: args["book_title"])
+    @instrumentation.timed("html")
     def generate_html(self, theme_name, book_title, dominant_font=None):
-        css_styles = self._get_theme_css(theme_name, dominant_font)
-        body_content = self._generate_standard_html()
+        css_styles = self.get_theme_css(theme_name, dominant_font)
+        body_content = self.render_blocks(self.content, self._image_data_uri)
         html_template = f"""
         <!DOCTYPE html>
         <html lang="en">
@@ -24,9 +30,34 @@ class StylingEngine:
         """
         return html_template
 
-    def _generate_standard_html(self):
+    @staticmethod
+    def image_file_path(block):
+        """Absolute path of an image block's file; parsers store paths relative to output_docs."""
+        return os.path.abspath(os.path.join("output_docs", block['path']))
+
+    def _image_data_uri(self, block):
+        # Encode image as data URI for portability
+        try:
+            with open(self.image_file_path(block), "rb") as image_file:
+                encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
+        except FileNotFoundError:
+            return None
+        return f"data:image/png;base64,{encoded_string}"
+
+    @staticmethod
+    def render_blocks(blocks, image_src, nest_captions=False):
+        """
+        Renders structured blocks as (X)HTML body markup. image_src(block) returns
+        the src for an image block, or None to leave the image out.
+        nest_captions puts each caption inside its image's <figure>, as EPUB
+        XHTML requires; a caption without a figure then becomes a <p>.
+        """
+        blocks = without_boilerplate(blocks)
+        nested = set()
         html_body_parts = []
-        for block in self.content:
+        for index, block in enumerate(blocks):
+            if index in nested:
+                continue
             block_type = block['type']
 
             # Safely escape HTML special characters in text content
@@ -41,31 +72,28 @@ class StylingEngine:
                     html_body_parts.append(f'<h2 class="heading">{block_content}</h2>')
                 elif block_type == 'code_block':
                     html_body_parts.append(f'<pre class="code_block"><code>{block_content}</code></pre>')
+                elif block_type == 'image_caption' and nest_captions:
+                    html_body_parts.append(f'<p class="image-caption">{block_content}</p>')
                 elif block_type == 'image_caption':
                     # Use figcaption for semantic captioning (within figure below)
                     html_body_parts.append(f'<figcaption class="image-caption">{block_content}</figcaption>')
 
             elif block_type == 'image':
-                # Encode image as data URI for portability
-                relative_image_path = os.path.join("output_docs", block['path'])
-                absolute_image_path = os.path.abspath(relative_image_path)
-
-                try:
-                    with open(absolute_image_path, "rb") as image_file:
-                        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-                    image_url = f"data:image/png;base64,{encoded_string}"
-                    # Wrap image and caption (if any) together with semantic <figure>
-                    html_body_parts.append(f'<figure class="image-container"><img src="{image_url}" alt="Image" class="embedded-image"/>')
-                    # Insert following block if it's an immediate caption (handled outside this method)
-                    # But we rely on caption block separately appended; so no inline here.
-                    html_body_parts.append('</figure>')
-                except FileNotFoundError:
+                image_url = image_src(block)
+                if image_url is None:
                     # Skip missing images gracefully
                     continue
+                # Wrap image and caption (if any) together with semantic <figure>
+                html_body_parts.append(f'<figure class="image-container"><img src="{html.escape(image_url)}" alt="Image" class="embedded-image"/>')
+                if nest_captions and index + 1 < len(blocks) and blocks[index + 1]['type'] == 'image_caption':
+                    html_body_parts.append(f'<figcaption class="image-caption">{html.escape(blocks[index + 1]["content"])}</figcaption>')
+                    nested.add(index + 1)
+                # Otherwise (PDF output) the caption follows the figure as its own block.
+                html_body_parts.append('</figure>')
 
         return "\n".join(html_body_parts)
 
-    def _get_theme_css(self, theme_name, dominant_font=None):
+    def get_theme_css(self, theme_name, dominant_font=None):
         base_font_override = ""
         if dominant_font:
             # Inject dominant font with high priority if available
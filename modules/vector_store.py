@@ -0,0 +1,134 @@
+# BookAlchemist/modules/vector_store.py
+
+import json
+import os
+import shutil
+from langchain_core.documents import Document
+
+
+class ChromaLibraryStore:
+    """
+    A single Chroma collection shared by every book in the library.
+    Each chunk is tagged with its book_id, so switching books is just a
+    different metadata filter instead of opening another database.
+    A book counts as indexed only once its completion marker is written
+    after the last batch, so an interrupted ingest is redone, not trusted.
+
+    Older versions kept one database per book in chroma_cache/<book_id>.
+    Those are not read any more: each is deleted once its book has been
+    ingested into the shared collection.
+    """
+    COLLECTION_NAME = "book_alchemist_library"
+    ADD_BATCH_SIZE = 1000
+
+    def __init__(self, embeddings, persist_directory=os.path.join("./chroma_cache", "_library")):
+        import chromadb
+        from langchain_chroma import Chroma
+        self.embeddings = embeddings
+        self.persist_directory = persist_directory
+        self.markers_directory = os.path.join(self.persist_directory, "complete_books")
+        os.makedirs(self.markers_directory, exist_ok=True)
+        # One client for the lifetime of the assistant, shared with LangChain's wrapper.
+        client = chromadb.PersistentClient(path=self.persist_directory)
+        self.collection = client.get_or_create_collection(self.COLLECTION_NAME)
+        self.db = Chroma(
+            client=client,
+            collection_name=self.COLLECTION_NAME,
+            embedding_function=self.embeddings
+        )
+        self._report_legacy_books()
+
+    def _is_legacy_index(self, path):
+        return (os.path.isfile(os.path.join(path, "chroma.sqlite3"))
+                and os.path.abspath(path) != os.path.abspath(self.persist_directory))
+
+    def _report_legacy_books(self):
+        parent = os.path.dirname(self.persist_directory) or "."
+        legacy = [name for name in sorted(os.listdir(parent)) if self._is_legacy_index(os.path.join(parent, name))]
+        if legacy:
+            print(f"ℹ️ Found {len(legacy)} per-book index(es) from an older version in {parent} "
+                  f"({', '.join(legacy)}). They are no longer used; each is removed when its book "
+                  f"is ingested again, or they can be deleted by hand.")
+
+    def _marker_path(self, book_id):
+        return os.path.join(self.markers_directory, f"{book_id}.json")
+
+    def has_book(self, book_id):
+        return os.path.exists(self._marker_path(book_id))
+
+    def add_book(self, book_id, texts, progress_callback=None):
+        """Embeds and stores the chunks of one book, tagged with its ID."""
+        # Leftovers of an interrupted ingest (or a pre-marker index) would clash with the new IDs.
+        self.delete_book(book_id)
+        for start in range(0, len(texts), self.ADD_BATCH_SIZE):
+            if progress_callback:
+                progress_callback("embedding", start / len(texts))
+            batch = texts[start:start + self.ADD_BATCH_SIZE]
+            self.db.add_texts(
+                texts=batch,
+                metadatas=[{"book_id": book_id, "chunk": start + i} for i in range(len(batch))],
+                ids=[f"{book_id}:{start + i}" for i in range(len(batch))]
+            )
+        tmp_path = f"{self._marker_path(book_id)}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"count": len(texts)}, f)
+        os.replace(tmp_path, self._marker_path(book_id))
+        legacy_path = os.path.join(os.path.dirname(self.persist_directory), book_id)
+        if self._is_legacy_index(legacy_path):
+            shutil.rmtree(legacy_path, ignore_errors=True)
+            print(f"🧹 Removed the old per-book index at {legacy_path}.")
+
+    def delete_book(self, book_id):
+        """Removes one book's chunks without touching the rest of the library."""
+        # Marker first: a delete that is cut short leaves an incomplete book, not a truncated one.
+        if os.path.exists(self._marker_path(book_id)):
+            os.remove(self._marker_path(book_id))
+        ids = self.db.get(where={"book_id": book_id}, include=[]).get('ids', [])
+        if ids:
+            self.db.delete(ids=ids)
+        return len(ids)
+
+    def book_filter(self, book_ids):
+        book_ids = list(book_ids)
+        if len(book_ids) == 1:
+            return {"book_id": book_ids[0]}
+        return {"book_id": {"$in": book_ids}}
+
+    def similarity_search_by_vector(self, vector, k=4, book_ids=None):
+        return self.similarity_search_by_vectors([vector], k=k, book_ids=book_ids)[0]
+
+    def similarity_search_by_vectors(self, vectors, k=4, book_ids=None):
+        """One Chroma query for a whole batch of query vectors."""
+        result = self.collection.query(
+            query_embeddings=[list(vector) for vector in vectors], n_results=k,
+            where=self.book_filter(book_ids), include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [Document(page_content=text, metadata={**metadata, "distance": distance})
+             for text, metadata, distance in zip(texts, metadatas, distances)]
+            for texts, metadatas, distances in zip(result['documents'], result['metadatas'], result['distances'])
+        ]
+
+    def get_chunks(self, book_id, rows):
+        """Fetches chunks by their row numbers, in the order requested."""
+        ids = [f"{book_id}:{row}" for row in rows]
+        result = self.db.get(ids=ids, include=["documents", "metadatas"])
+        found = dict(zip(result['ids'], zip(result['documents'], result['metadatas'])))
+        return [Document(page_content=found[i][0], metadata=found[i][1]) for i in ids if i in found]
+
+    def as_retriever(self, book_ids, k=4):
+        """A retriever whose results are scoped to the given books."""
+        return self.db.as_retriever(search_kwargs={"k": k, "filter": self.book_filter(book_ids)})
+
+
+VECTOR_BACKENDS = ("chroma", "memmap")
+
+
+def create_vector_store(backend, embeddings, dtype="float16"):
+    """Opens the library index for the configured backend. dtype is used by memmap only."""
+    if backend == "chroma":
+        return ChromaLibraryStore(embeddings)
+    if backend == "memmap":
+        from modules.memmap_store import MemmapLibraryStore
+        return MemmapLibraryStore(embeddings, dtype=dtype)
+    raise ValueError(f"Unsupported vector backend: {backend}")